@@ -0,0 +1,300 @@
+"""
+Нагрузочный тест бота целиком: все роутеры, базы и модели вместе.
+
+Собирает настоящий TelegramBot с заглушкой вместо сессии Bot (в сеть ничего
+не уходит) и временными базами, подаёт обновления в Dispatcher.feed_update с
+заданной частотой и печатает в JSON пропускную способность, задержки
+(p50/p95/p99 по типам обновлений) и задержку event loop.
+
+Поток обновлений - синтетический (обычные сообщения, /find_free_time,
+/schedule_add, /add_users в заданной пропорции) или записанный: JSONL, по
+одному Update в строке, как их присылает Telegram.
+
+Пример:
+    python -m BENCHMARK.load_test --rate 50 --duration 60 --chats 20 --output load.json
+    python -m BENCHMARK.load_test --replay updates.jsonl --rate 100
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from aiogram.client.session.base import BaseSession
+from aiogram.types import AcceptedGiftTypes, Update
+
+from BOT.config import Config
+from BOT.logging_config import setup_logging
+
+BOT_TOKEN = '123456:load-test'
+BOT_ID = 123456
+WORDS = ('встреча', 'сегодня', 'вечером', 'давайте', 'обсудим', 'проект', 'кто', 'придёт', 'завтра', 'в', 'офис',
+         'кофе', 'после', 'пары', 'дедлайн', 'отчёт', 'идея', 'нормально', 'согласен', 'тогда', 'время', 'место')
+DEFAULT_MIX = 'message=85,find_free_time=5,schedule_add=7,add_users=3'
+
+
+class StubSession(BaseSession):
+    """Сессия Bot без сети: отвечает правдоподобными результатами и считает вызовы методов"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.message_ids = iter(range(1, 10 ** 12))
+
+    def result_for(self, method):
+        name = method.__api_method__
+        now = int(time.time())
+        if name == 'getMe':
+            return {'id': BOT_ID, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+        if name.startswith('send'):
+            chat_id = method.chat_id
+            return {'message_id': next(self.message_ids), 'date': now, 'text': getattr(method, 'text', None),
+                    'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'}}
+        if name == 'getChat':
+            return {'id': method.chat_id, 'type': 'private', 'first_name': f'user{method.chat_id}',
+                    'username': f'user{method.chat_id}', 'accent_color_id': 0, 'max_reaction_count': 0,
+                    # Набор обязательных флагов меняется между версиями Bot API
+                    'accepted_gift_types': {name: True for name, field in AcceptedGiftTypes.model_fields.items()
+                                            if field.is_required()}}
+        if name == 'getChatMember':
+            return {'status': 'member', 'user': {'id': method.user_id, 'is_bot': False,
+                                                 'first_name': f'user{method.user_id}'}}
+        return True
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = json.dumps({'ok': True, 'result': self.result_for(method)})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        kind, weight = part.split('=')
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def random_text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+
+
+def synthetic_updates(args, rng):
+    """Бесконечный поток (тип, dict обновления) по смеси args.mix"""
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    chats = [-1000000000000 - i for i in range(args.chats)]
+    members = {chat_id: [(i + 1) * 1000 + j for j in range(args.users_per_chat)] for i, chat_id in enumerate(chats)}
+    today = datetime.now()
+
+    update_id = 0
+    while True:
+        update_id += 1
+        kind = rng.choices(kinds, weights)[0]
+        chat_id = rng.choice(chats)
+        user_id = rng.choice(members[chat_id])
+
+        if kind == 'find_free_time':
+            text = rng.choice(['/find_free_time', f'/find_free_time {max(1, args.users_per_chat // 2)} 60 3'])
+        elif kind == 'schedule_add':
+            date = (today + timedelta(days=rng.randrange(7))).strftime('%Y-%m-%d')
+            start = rng.randrange(8 * 4, 20 * 4) * 15
+            end = start + rng.choice((30, 60, 90))
+            text = f'/schedule_add {date} {start // 60:02d}:{start % 60:02d} {end // 60:02d}:{end % 60:02d} пара'
+        elif kind == 'add_users':
+            text = '/add_users ' + ' '.join(map(str, rng.sample(members[chat_id], min(3, len(members[chat_id])))))
+        else:
+            text = random_text(rng)
+
+        yield kind, {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'supergroup', 'title': f'chat {chat_id}'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+                'text': text,
+            },
+        }
+
+
+def recorded_updates(path):
+    """Обновления из JSONL; тип - команда сообщения или 'message'"""
+    while True:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                text = (data.get('message') or {}).get('text') or ''
+                kind = text.split()[0].lstrip('/').split('@')[0] if text.startswith('/') else 'message'
+                yield kind, data
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def at(q):
+        return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 3)
+
+    return {
+        'count': len(values),
+        'mean_ms': round(statistics.mean(values) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(values[-1] * 1000, 3),
+    }
+
+
+async def monitor_loop_lag(interval, lags, stop):
+    """Насколько позже запланированного просыпается корутина - задержка event loop"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+
+def make_config(args):
+    class LoadTestConfig(Config):
+        OUTBOUND_GLOBAL_RATE = args.global_rate or Config.OUTBOUND_GLOBAL_RATE
+        OUTBOUND_CHAT_RATE = args.chat_rate or Config.OUTBOUND_CHAT_RATE
+        METRICS_PORT = 0
+
+    return LoadTestConfig
+
+
+async def run(args):
+    from BOT.core import TelegramBot
+
+    rng = random.Random(args.seed)
+    session = StubSession(latency=args.api_latency / 1000)
+    source = recorded_updates(args.replay) if args.replay else synthetic_updates(args, rng)
+
+    with tempfile.TemporaryDirectory() as directory:
+        telegram_bot = TelegramBot(BOT_TOKEN, config=make_config(args), session=session, data_dir=directory)
+        bot, dp = telegram_bot.bot, telegram_bot.dp
+        await dp.emit_startup(bot=bot)
+
+        latencies = {}
+        errors = Counter()
+        tasks = set()
+
+        async def handle(kind, update, scheduled_at):
+            try:
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                errors[f'{kind}: {type(e).__name__}'] += 1
+            finally:
+                # От момента, когда обновление должно было прийти, а не когда до него дошла очередь
+                latencies.setdefault(kind, []).append(time.perf_counter() - scheduled_at)
+
+        lags = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(monitor_loop_lag(args.lag_interval / 1000, lags, stop))
+
+        total = int(args.rate * args.duration)
+        started = time.perf_counter()
+        for i in range(total):
+            kind, data = next(source)
+            scheduled_at = started + i / args.rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            update = Update.model_validate(data, context={'bot': bot})
+            task = asyncio.create_task(handle(kind, update, scheduled_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        sent_in = time.perf_counter() - started
+
+        _, pending = await asyncio.wait(tasks, timeout=args.drain_timeout) if tasks else (set(), set())
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+
+        completed = sum(len(values) for values in latencies.values())
+        report = {
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'seed': args.seed,
+                'source': args.replay or args.mix,
+                'target_rate': args.rate,
+                'duration_s': args.duration,
+                'api_latency_ms': args.api_latency,
+            },
+            'sent': total,
+            'completed': completed,
+            'unfinished': len(pending),
+            'errors': dict(errors),
+            'offered_rate': round(total / sent_in, 2) if sent_in else None,
+            'throughput': round(completed / elapsed, 2) if elapsed else None,
+            'latency': percentiles([value for values in latencies.values() for value in values]),
+            'latency_by_kind': {kind: percentiles(values) for kind, values in sorted(latencies.items())},
+            'event_loop_lag': percentiles(lags),
+            'outbound': telegram_bot.outbound.metrics(),
+            'api_calls': dict(session.calls),
+        }
+
+        for task in pending:
+            task.cancel()
+        await dp.emit_shutdown(bot=bot)
+
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота через Dispatcher.feed_update')
+    parser.add_argument('--rate', type=float, default=20, help='обновлений в секунду')
+    parser.add_argument('--duration', type=float, default=30, help='длительность подачи обновлений, с')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='доли типов обновлений')
+    parser.add_argument('--chats', type=int, default=10, help='число чатов в синтетическом потоке')
+    parser.add_argument('--users-per-chat', type=int, default=20)
+    parser.add_argument('--replay', help='JSONL с записанными обновлениями вместо синтетических')
+    parser.add_argument('--api-latency', type=float, default=50, help='задержка ответа заглушки Telegram API, мс')
+    parser.add_argument('--global-rate', type=float, help='OUTBOUND_GLOBAL_RATE на время теста')
+    parser.add_argument('--chat-rate', type=float, help='OUTBOUND_CHAT_RATE на время теста')
+    parser.add_argument('--lag-interval', type=float, default=10, help='период замера задержки event loop, мс')
+    parser.add_argument('--drain-timeout', type=float, default=120, help='сколько ждать незавершённые обновления, с')
+    parser.add_argument('--log-level', default='WARNING', help='уровень логов бота (пишутся в stderr)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для JSON, по умолчанию stdout')
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    setup_logging(args.log_level, fmt='text')
+    report = await run(args)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if report['errors'] or report['unfinished']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
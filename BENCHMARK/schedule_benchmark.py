@@ -0,0 +1,259 @@
+"""
+Бенчмарк планировщика: ScheduleUserDB.find_common_free_time и add_activity.
+
+Заполняет временную базу синтетическими пользователями и занятиями, замеряет
+время (запрос к базе отдельно от вычислений) и пиковую память, сверяет ответы
+всех движков поиска свободного времени и печатает результат в JSON.
+
+Пример:
+    python -m BENCHMARK.schedule_benchmark --users 10,100,1000,10000 --density 1,4 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import aiosqlite
+
+from DATABASE.user_schedule import ScheduleUserDB
+
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+async def dataframe_engine(database, user_ids, days_range):
+    return await database.find_common_free_time_dataframe(user_ids, days_range)
+
+
+async def bitset_engine(database, user_ids, days_range):
+    return await database.find_common_free_time_bitset(user_ids, days_range)
+
+
+async def sweep_engine(database, user_ids, days_range):
+    windows = await database.find_quorum_free_time(user_ids, days_range, len(user_ids), top=None)
+    return sorted((start, end) for start, end, _ in windows)
+
+
+# Движок -> (функция, методы базы, время которых считается временем запроса)
+ENGINES = {
+    'dataframe': (dataframe_engine, ['get_activities_from_db']),
+    'sweep': (sweep_engine, ['get_activities_from_db']),
+    'bitset': (bitset_engine, ['get_availability_from_db']),
+}
+
+
+def generate_activities(user_ids, days_range, density, rng):
+    """Генерирует непересекающиеся занятия: density штук на пользователя в день"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = []
+
+    for user_id in user_ids:
+        for day_offset in range(days_range):
+            date = (today + timedelta(days=day_offset)).strftime('%Y-%m-%d')
+            starts = sorted(rng.sample(range(8 * 4, 21 * 4), min(density, 13 * 4)))
+
+            busy_until = 0
+            for i, slot in enumerate(starts):
+                start = slot * 15
+                if start < busy_until:
+                    continue
+                end = min(start + rng.choice((30, 45, 60, 90, 120)), 22 * 60)
+                busy_until = end
+                rows.append((user_id, date, f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}",
+                             f"activity_{i}"))
+
+    return rows
+
+
+async def fill_database(database, rows):
+    async with aiosqlite.connect(database.path) as db:
+        await db.executemany('''
+        INSERT INTO schedules (user_id, date, start_time, end_time, activity_name)
+        VALUES (?, ?, ?, ?, ?)''', rows)
+        await db.commit()
+
+    await database.rebuild_availability_index()
+
+
+def instrument(database, method_names, timings):
+    """Подменяет методы базы обёртками, которые копят время запроса в timings['query']"""
+    originals = {}
+
+    for name in method_names:
+        original = getattr(database, name)
+        originals[name] = original
+
+        async def timed(*args, _original=original, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await _original(*args, **kwargs)
+            finally:
+                timings['query'] += time.perf_counter() - started
+
+        setattr(database, name, timed)
+
+    return originals
+
+
+async def run_engine(database, engine, user_ids, days_range, repeat):
+    function, query_methods = ENGINES[engine]
+
+    walls, queries = [], []
+    periods = None
+    for _ in range(repeat):
+        timings = {'query': 0.0}
+        originals = instrument(database, query_methods, timings)
+        try:
+            started = time.perf_counter()
+            periods = await function(database, user_ids, days_range)
+            walls.append(time.perf_counter() - started)
+            queries.append(timings['query'])
+        finally:
+            for name in originals:
+                delattr(database, name)
+
+    tracemalloc.start()
+    try:
+        await function(database, user_ids, days_range)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    wall = statistics.median(walls)
+    query = statistics.median(queries)
+    return {
+        'wall_ms': round(wall * 1000, 3),
+        'query_ms': round(query * 1000, 3),
+        'compute_ms': round((wall - query) * 1000, 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'periods': len(periods),
+    }, [(start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT)) for start, end in periods]
+
+
+async def bench_add_activity(database, user_ids, days_range, samples, rng):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    latencies = []
+
+    for i in range(samples):
+        date = (today + timedelta(days=rng.randrange(days_range))).strftime('%Y-%m-%d')
+        start = rng.randrange(8 * 60, 21 * 60)
+        end = start + 30
+
+        started = time.perf_counter()
+        await database.add_activity(rng.choice(user_ids), date, f"{start // 60:02d}:{start % 60:02d}",
+                                    f"{end // 60:02d}:{end % 60:02d}", f"bench_{i}")
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    return {
+        'samples': samples,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 3),
+    }
+
+
+async def bench_case(users, density, args, engines):
+    rng = random.Random(f"{args.seed}-{users}-{density}")
+    user_ids = list(range(1, users + 1))
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = ScheduleUserDB(os.path.join(directory, 'user_schedule.db'))
+        await database.init_db()
+
+        rows = generate_activities(user_ids, args.days, density, rng)
+        await fill_database(database, rows)
+
+        result = {'users': users, 'density': density, 'activities': len(rows), 'engines': {}}
+
+        answers = {}
+        for engine in engines:
+            result['engines'][engine], answers[engine] = await run_engine(database, engine, user_ids, args.days,
+                                                                          args.repeat)
+
+        reference = answers[engines[0]]
+        result['mismatches'] = [engine for engine in engines[1:] if answers[engine] != reference]
+
+        result['add_activity'] = await bench_add_activity(database, user_ids, args.days, args.add_samples, rng)
+
+    return result
+
+
+def find_regressions(results, baseline_path, tolerance):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    previous = {
+        (case['users'], case['density'], engine): stats['wall_ms']
+        for case in baseline['results']
+        for engine, stats in case['engines'].items()
+    }
+
+    regressions = []
+    for case in results:
+        for engine, stats in case['engines'].items():
+            before = previous.get((case['users'], case['density'], engine))
+            if before and stats['wall_ms'] > before * tolerance:
+                regressions.append({'users': case['users'], 'density': case['density'], 'engine': engine,
+                                    'baseline_ms': before, 'wall_ms': stats['wall_ms']})
+
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Бенчмарк поиска общего свободного времени')
+    parser.add_argument('--users', default='10,100,1000,10000', help='размеры чатов через запятую')
+    parser.add_argument('--density', default='1,4', help='занятий на пользователя в день через запятую')
+    parser.add_argument('--days', type=int, default=7, help='глубина поиска в днях')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='движки через запятую, первый - эталон')
+    parser.add_argument('--repeat', type=int, default=3, help='повторов замера, берётся медиана')
+    parser.add_argument('--add-samples', type=int, default=200, help='сколько раз вызвать add_activity')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для JSON, по умолчанию stdout')
+    parser.add_argument('--baseline', help='JSON прошлого запуска для поиска регрессий')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='допустимое замедление относительно baseline')
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    engines = args.engines.split(',')
+
+    results = []
+    for users in map(int, args.users.split(',')):
+        for density in map(int, args.density.split(',')):
+            results.append(await bench_case(users, density, args, engines))
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'days': args.days,
+            'repeat': args.repeat,
+            'engines': engines,
+        },
+        'results': results,
+    }
+    if args.baseline:
+        report['regressions'] = find_regressions(results, args.baseline, args.tolerance)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if any(case['mismatches'] for case in results) or report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Память и время запуска воркеров ShardedBotPool с PRELOAD_MODELS и без.
+
+Запускает N настоящих воркеров (TelegramBot с моделями модерации, обновления
+им не подаются), ждёт первого heartbeat от каждого и печатает в JSON время
+до готовности всех воркеров и их память из /proc: rss_kb, pss_kb (общие
+страницы поделены между процессами), shared_kb и private_kb. Базы, как и в
+ShardedBotPool.run, создаются до запуска воркеров во временном каталоге,
+/metrics воркеров отключён.
+
+Пример:
+    python -m BENCHMARK.worker_memory --workers 3 --output memory.json
+    python -m BENCHMARK.worker_memory --workers 4 --mode preload
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+
+# Читается BOT.config в воркерах при импорте, поэтому до импортов BOT
+os.environ['METRICS_PORT'] = '0'
+
+from BOT.logging_config import setup_logging  # noqa: E402
+from BOT.workers import ShardedBotPool  # noqa: E402
+
+BOT_TOKEN = '123456:worker-memory'
+MEMORY_FIELDS = ('rss_kb', 'pss_kb', 'shared_kb', 'private_kb')
+
+
+def measure(workers: int, preload: bool, timeout: float):
+    pool = ShardedBotPool(BOT_TOKEN, workers, heartbeat_interval=0.5, preload_models=preload)
+    asyncio.run(pool.prepare_databases())
+    started = time.perf_counter()
+    try:
+        for index in range(workers):
+            pool.start_worker(index)
+
+        while not all(heartbeat.value for heartbeat in pool.heartbeats):
+            if time.perf_counter() - started > timeout:
+                raise TimeoutError(f"Воркеры не запустились за {timeout} с")
+            if not all(process.is_alive() for process in pool.processes):
+                raise RuntimeError("Воркер завершился при запуске, подробности в логе")
+            time.sleep(0.1)
+        ready = time.perf_counter() - started
+
+        health = pool.health()
+    finally:
+        pool.stop_workers(timeout=10)
+        asyncio.run(pool.bot.session.close())
+
+    return {
+        'preload_models': preload,
+        'startup_s': round(ready, 3),
+        'workers': [{key: worker.get(key) for key in ('worker', 'pid') + MEMORY_FIELDS} for worker in health],
+        **{f'total_{key}': sum(worker.get(key, 0) for worker in health) for key in MEMORY_FIELDS},
+        **{f'mean_{key}': sum(worker.get(key, 0) for worker in health) // len(health) for key in MEMORY_FIELDS},
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Память и время запуска воркеров с общими моделями и без')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--mode', choices=('both', 'spawn', 'preload'), default='both',
+                        help='spawn - каждый воркер загружает модели сам, preload - общие модели через forkserver')
+    parser.add_argument('--timeout', type=float, default=600, help='сколько ждать запуска воркеров, с')
+    parser.add_argument('--log-level', default='WARNING', help='уровень логов (пишутся в stderr)')
+    parser.add_argument('--output', help='файл для JSON, по умолчанию stdout')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging(args.log_level, fmt='text')
+    os.environ['LOG_LEVEL'] = args.log_level
+
+    output = os.path.abspath(args.output) if args.output else None
+
+    modes = {'both': (False, True), 'spawn': (False,), 'preload': (True,)}[args.mode]
+    with tempfile.TemporaryDirectory() as directory:
+        # Воркеры создают базы в ./data относительно рабочего каталога
+        os.makedirs(os.path.join(directory, 'data'))
+        os.chdir(directory)
+        results = [measure(args.workers, preload, args.timeout) for preload in modes]
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': args.workers,
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+
+
+class Config:
+    """Настройки бота из переменных окружения"""
+
+    BOT_TOKEN = os.getenv("BOT_TOKEN")
+
+    # polling или webhook
+    DELIVERY_MODE = os.getenv("DELIVERY_MODE", "polling")
+
+    # Публичный https-адрес, на который Telegram будет присылать обновления
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "100"))
+
+    # Число процессов-воркеров, между которыми обновления делятся по chat_id; 0 - всё в одном процессе
+    WORKERS = int(os.getenv("WORKERS", "0"))
+    # 1 - модели загружаются один раз и делятся между воркерами (forkserver + copy-on-write), только Linux/macOS
+    PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+
+    # Лимиты исходящих запросов к Telegram: сообщений в секунду всего и в один чат
+    OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+    OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+
+    # Лимиты запросов к Nominatim (по его правилам не больше 1 в секунду) и Overpass:
+    # запросов в секунду и размер всплеска
+    NOMINATIM_RATE = float(os.getenv("NOMINATIM_RATE", "1"))
+    OVERPASS_RATE = float(os.getenv("OVERPASS_RATE", "1"))
+    OVERPASS_BURST = float(os.getenv("OVERPASS_BURST", "2"))
+
+    # Локальный эндпоинт /metrics в формате Prometheus; 0 - выключен
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+    # Логи: уровень, формат json или text и доля отладочных записей, которые пишутся
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+    # Деградация модерации под нагрузкой: пороги очереди к моделям и возраста сообщения (с)
+    # для режимов "без проверки темы", "выборочно" и "без проверок"
+    MODERATION_QUEUE_DEPTHS = tuple(int(x) for x in os.getenv("MODERATION_QUEUE_DEPTHS", "8,32,128").split(","))
+    MODERATION_MESSAGE_AGES = tuple(float(x) for x in os.getenv("MODERATION_MESSAGE_AGES", "5,15,60").split(","))
+    MODERATION_SAMPLE_RATE = float(os.getenv("MODERATION_SAMPLE_RATE", "0.2"))
+    MODERATION_RECOVERY_SECONDS = float(os.getenv("MODERATION_RECOVERY_SECONDS", "10"))
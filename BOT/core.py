@@ -1,30 +1,81 @@
+import asyncio
+import logging
+import os
+
 from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from BOT.config import Config
 
 from BOT.handlers.base_handlers.base_handlers import BaseHandlers
 from BOT.handlers.map_handlers.map_handlers import MapHandlers
+from BOT.handlers.moderation_handlers.load_shedding import LoadShedder
 from BOT.handlers.moderation_handlers.moderation_handlers import ModerationHandlers
 from BOT.handlers.schedule_handlers.schedule_handlers import ScheduleHandlers
 from BOT.handlers.user_handlers.user_handlers import UserHandlers
+from BOT.metrics import BotMetrics, MetricsServer
+from BOT.outbound import OutboundQueue
+from BOT.webhook import WebhookServer
 
 from DATABASE.chat_messages import DBOfMessage
 from DATABASE.chat_users import ChatUsersDB
+from DATABASE.geocode_cache import GeocodeCacheDB
 from DATABASE.user_schedule import ScheduleUserDB
 
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "./data"
+
+
+def create_databases(data_dir: str = DATA_DIR):
+    """Базы бота: сообщения чатов, расписания, участники чатов и кэш геокодирования"""
+    return (
+        DBOfMessage(os.path.join(data_dir, "chat_messages.db")),
+        ScheduleUserDB(os.path.join(data_dir, "user_schedule.db")),
+        ChatUsersDB(os.path.join(data_dir, "chat_users.db")),
+        GeocodeCacheDB(os.path.join(data_dir, "geocode_cache.db")),
+    )
+
+
+async def init_databases(databases):
+    """Создаёт таблицы, перестраивает индекс занятости и чистит устаревший кэш"""
+    logger.info("🔧 Инициализация баз данных...")
+    for database in databases:
+        await database.init_db()
+    logger.info("✅ Базы данных готовы")
+
 
 class TelegramBot:
-    def __init__(self, token):
-        self.bot = Bot(token)
+    def __init__(self, token, config=Config, session=None, data_dir=DATA_DIR, models=None, init_db=True):
+        """
+        init_db=False - базы уже подготовил другой процесс (фронт ShardedBotPool),
+        и on_startup их не трогает.
+        """
+        self.config = config
+        self.models = models
+        self.data_dir = data_dir
+        self.init_db = init_db
+        self.bot = Bot(token, session=session)
+        self.outbound = OutboundQueue(
+            global_rate=config.OUTBOUND_GLOBAL_RATE,
+            global_burst=config.OUTBOUND_GLOBAL_RATE,
+            chat_rate=config.OUTBOUND_CHAT_RATE,
+        )
+        self.bot.session.middleware(self.outbound)
         self.dp = Dispatcher()
+        self.metrics = BotMetrics()
+        self.metrics_server = MetricsServer(self.metrics.registry, config.METRICS_HOST, config.METRICS_PORT) \
+            if config.METRICS_PORT else None
         self._init_databases()
         self._init_handlers()
         self.dp.startup.register(self.on_startup)
         self.dp.shutdown.register(self.on_shutdown)
         self._register_routers()
+        self._register_metrics()
 
     def _init_databases(self):
-        self.chat_messages_db = DBOfMessage("./data/chat_messages.db")
-        self.user_schedule_db = ScheduleUserDB("./data/user_schedule.db")
-        self.chat_users_db = ChatUsersDB("./data/chat_users.db")
+        self.databases = create_databases(self.data_dir)
+        self.chat_messages_db, self.user_schedule_db, self.chat_users_db, self.geocode_cache_db = self.databases
 
     def _init_handlers(self):
         self.base_handlers = BaseHandlers()
@@ -32,6 +83,15 @@ class TelegramBot:
         self.moderation_handlers = ModerationHandlers(
             bot=self.bot,
             database_of_messages=self.chat_messages_db,
+            metrics=self.metrics,
+            models=self.models,
+            load_shedder=LoadShedder(
+                queue_depths=self.config.MODERATION_QUEUE_DEPTHS,
+                message_ages=self.config.MODERATION_MESSAGE_AGES,
+                sample_rate=self.config.MODERATION_SAMPLE_RATE,
+                recovery_seconds=self.config.MODERATION_RECOVERY_SECONDS,
+                metrics=self.metrics,
+            ),
         )
 
         self.schedule_handlers = ScheduleHandlers(
@@ -40,7 +100,12 @@ class TelegramBot:
             database_of_users=self.chat_users_db
         )
 
-        self.map_handlers = MapHandlers()
+        self.map_handlers = MapHandlers(
+            database_of_geocodes=self.geocode_cache_db,
+            nominatim_rate=self.config.NOMINATIM_RATE,
+            overpass_rate=self.config.OVERPASS_RATE,
+            overpass_burst=self.config.OVERPASS_BURST,
+        )
 
         self.user_handlers = UserHandlers(
             bot=self.bot,
@@ -54,37 +119,85 @@ class TelegramBot:
         self.dp.include_router(self.map_handlers.router)
         self.dp.include_router(self.moderation_handlers.router)
 
+    def _register_metrics(self):
+        self.dp.update.outer_middleware(self.metrics.update_middleware())
+        for router in self.dp.sub_routers:
+            router.message.middleware(self.metrics.handler_middleware())
+
+        self.metrics.registry.add_collector('outbound', self.outbound.metrics)
+        self.metrics.registry.add_collector('map', self.map_handlers.metrics)
+        self.metrics.registry.add_collector('moderation', self.moderation_handlers.stats)
+
     async def on_startup(self):
-        print("=" * 50)
-        print("🤖 Запуск бота для организации встреч")
-        print("=" * 50)
+        logger.info("🤖 Запуск бота для организации встреч")
 
         # 1. Инициализация баз данных
-        print("🔧 Инициализация баз данных...")
-        await self.chat_messages_db.init_db()
-        await self.user_schedule_db.init_db()
-        await self.chat_users_db.init_db()
-        print("✅ Базы данных готовы")
+        if self.init_db:
+            await init_databases(self.databases)
+
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
 
-        print("=" * 50)
-        print("🚀 Бот успешно запущен и готов к работе!")
-        print(f"🤖 ID бота: {self.bot.id}")
-        print("=" * 50)
+        logger.info("🚀 Бот успешно запущен и готов к работе!", extra={'bot_id': self.bot.id})
 
     async def on_shutdown(self):
-        print("\n🛑 Завершение работы бота...")
-        print("👋 Бот завершил работу")
+        logger.info("🛑 Завершение работы бота...")
+        await self.outbound.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.map_handlers.close()
+        self.moderation_handlers.close()
+        logger.info("👋 Бот завершил работу")
+
+    async def start_webhook(self):
+        """
+        Вебхук с тем же жизненным циклом, что и start_polling: emit_startup до
+        приёма обновлений и emit_shutdown после того, как принятые обновления
+        обработаны. Сессию бота закрывает start() последней.
+        """
+        server = WebhookServer(
+            bot=self.bot,
+            feed_update=lambda update: self.dp.feed_update(self.bot, update),
+            path=self.config.WEBHOOK_PATH,
+            secret_token=self.config.WEBHOOK_SECRET,
+            max_in_flight=self.config.WEBHOOK_MAX_IN_FLIGHT,
+        )
+        runner = web.AppRunner(server.create_app())
 
-    async def start(self):
+        await self.dp.emit_startup(bot=self.bot)
         try:
-            await self.bot.delete_webhook(drop_pending_updates=True)
-            await self.dp.start_polling(
-                self.bot,
-                allowed_updates=self.dp.resolve_used_update_types()
+            await runner.setup()
+            await web.TCPSite(runner, self.config.WEBHOOK_HOST, self.config.WEBHOOK_PORT).start()
+            await self.bot.set_webhook(
+                url=self.config.WEBHOOK_URL,
+                secret_token=self.config.WEBHOOK_SECRET,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                max_connections=min(self.config.WEBHOOK_MAX_IN_FLIGHT, 100),
+                drop_pending_updates=True,
             )
+            logger.info("🌐 Вебхук слушает %s:%d%s",
+                        self.config.WEBHOOK_HOST, self.config.WEBHOOK_PORT, self.config.WEBHOOK_PATH)
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await server.drain()
+            await self.dp.emit_shutdown(bot=self.bot)
+
+    async def start(self):
+        try:
+            if self.config.DELIVERY_MODE == "webhook":
+                await self.start_webhook()
+            else:
+                await self.bot.delete_webhook(drop_pending_updates=True)
+                # on_startup и on_shutdown вызывает сам start_polling, сессию закрываем ниже
+                await self.dp.start_polling(
+                    self.bot,
+                    allowed_updates=self.dp.resolve_used_update_types(),
+                    close_bot_session=False,
+                )
         except Exception as e:
-            print(f"Критическая ошибка при запуске: {e}")
+            logger.critical("Критическая ошибка при запуске: %s", e, exc_info=True)
             raise
         finally:
-            await self.on_shutdown()
-
+            # Последней, чтобы on_shutdown успел отправить запросы из очереди
+            await self.bot.session.close()
@@ -7,10 +7,12 @@ key_board = ReplyKeyboardMarkup(resize_keyboard=True,
 help_command ='''<b>/help</b> - выводит все обрабатываемые команды
 <b>/about</b> - выводит описание бота
 <b>/add_activity</b> - добавление действия в ваше расписание(Важно соблюдать структуру, смотрите примеры)
+<b>/schedule_add_recurring</b> - добавляет занятие, которое повторяется каждый день или каждую неделю до указанной даты
+<b>/schedule_skip</b> - отменяет одно повторение повторяющегося занятия
 <b>/add_users</b> - добавляет пользователя чата в группу пользователей, расписание которых учитывается при составление удобных окон для встреч
 <b>/delete_users</b> - удаляет пользователя из группы пользователей, расписание которых учитывается при составление удобных окон для встреч
-<b>/find_free_time</b> - выводит подходящее всем время на ближайшую неделю
-<b>/find_nearest_places</b> - выводит 5 лучших заведений поблизости
+<b>/find_free_time</b> - выводит подходящее всем время на ближайшую неделю, можно указать минимальное число свободных участников, длительность окна в минутах и количество окон
+<b>/find_nearest_places</b> - выводит лучшие заведения поблизости, радиус поиска расширяется, пока они не найдутся
 <b>/delete_activity</b> - удаляет из расписания занятие
 <b>/examples</b> - показывает примеры корректного использования функций
 <b>/schedules</b> - выводит расписание на день который вы укажите
@@ -32,6 +34,13 @@ examples ='''<b>Примеры использования команд</b>
 /add_activity ГГГГ-ММ-ДД ЧЧ:ММ ЧЧ:ММ название
 /add_activity 2025-12-12 13:00 14:00 праздник
 
+/schedule_add_recurring периодичность ГГГГ-ММ-ДД ГГГГ-ММ-ДД ЧЧ:ММ ЧЧ:ММ название
+/schedule_add_recurring еженедельно 2025-09-01 2025-12-28 10:00 11:30 матанализ
+периодичность: ежедневно или еженедельно, вторая дата - последний день повторений
+
+/schedule_skip ГГГГ-ММ-ДД название
+/schedule_skip 2025-11-04 матанализ
+
 /add_users id-пользователя
 пользователь должен находиться в чате и у него должен быть начат диалог с ботом
 
@@ -44,8 +53,14 @@ examples ='''<b>Примеры использования команд</b>
 /find_free_time
 ничего писать не нужно
 
+/find_free_time участники минуты количество-окон
+/find_free_time 3 60 5
+выводит 5 лучших окон хотя бы на час, когда свободны минимум 3 участника
+
 /find_nearest_places нужно указать город и улицу, рядом с которой нужно найти места
 /find_nearest_places Новосибирск, Ляпунова 2
+перед адресом можно указать количество (до 10) и типы: кафе, ресторан, бар, паб, фастфуд, пивной_сад
+/find_nearest_places k=3 типы=кафе,бар Новосибирск, Ляпунова 2
 
 
 /schedules ГГГГ-ММ-ДД
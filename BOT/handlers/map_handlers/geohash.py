@@ -0,0 +1,74 @@
+from math import cos, radians
+from typing import List, Tuple
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+METERS_PER_DEGREE = 111320
+
+
+def encode(latitude: float, longitude: float, precision: int = 6) -> str:
+    """Кодирует точку в geohash заданной длины"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def bounding_box(geohash: str) -> Tuple[float, float, float, float]:
+    """Возвращает границы тайла: (юг, запад, север, восток)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+
+    even = True
+    for char in geohash:
+        code = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if code >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def tiles_in_radius(latitude: float, longitude: float, radius: float, precision: int = 6) -> List[str]:
+    """Тайлы, покрывающие квадрат, описанный вокруг круга радиуса radius метров"""
+    lat_delta = radius / METERS_PER_DEGREE
+    lon_delta = radius / (METERS_PER_DEGREE * max(cos(radians(latitude)), 0.01))
+
+    south, west, north, east = bounding_box(encode(latitude - lat_delta, longitude - lon_delta, precision))
+    height, width = north - south, east - west
+
+    tiles = []
+    lat = (south + north) / 2
+    while lat - height / 2 <= latitude + lat_delta:
+        lon = (west + east) / 2
+        while lon - width / 2 <= longitude + lon_delta:
+            tiles.append(encode(lat, lon, precision))
+            lon += width
+        lat += height
+
+    return tiles
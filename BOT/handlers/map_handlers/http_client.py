@@ -0,0 +1,151 @@
+import asyncio
+import json
+import random
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов: при нехватке токенов запрос ждёт в очереди, а не падает"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+        self.waiting = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def acquire(self):
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self.lock:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+
+        wait = time.monotonic() - started
+        self.acquired += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self.waiting,
+            'acquired': self.acquired,
+            'wait_seconds_total': self.total_wait,
+            'wait_seconds_max': self.max_wait,
+            'wait_seconds_mean': self.total_wait / self.acquired if self.acquired else 0.0,
+        }
+
+
+class SingleFlight:
+    """Одинаковые одновременные вызовы разделяют один выполняющийся запрос"""
+
+    def __init__(self):
+        self.calls: Dict[Tuple, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Tuple, factory):
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self.calls[key] = future
+            future.add_done_callback(lambda _: self.calls.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(future)
+
+
+class MapHttpClient:
+    """Одна долгоживущая aiohttp-сессия на все запросы к Nominatim и Overpass"""
+
+    def __init__(self, headers: Optional[Dict] = None, timeout: float = 10, max_concurrency: int = 4,
+                 retries: int = 3, backoff: float = 0.5, rate_limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.headers = headers or {}
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.limiters = {host: TokenBucket(rate, capacity) for host, (rate, capacity) in (rate_limits or {}).items()}
+        self.single_flight = SingleFlight()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, ttl_dns_cache=300, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(headers=self.headers, timeout=self.timeout, connector=connector)
+        return self.session
+
+    async def request_json(self, method: str, url: str, **kwargs):
+        """
+        Выполняет запрос и возвращает разобранный JSON.
+
+        Одинаковые одновременные запросы объединяются в один. Ошибки соединения,
+        таймауты и ответы 429/5xx повторяются с экспоненциальной задержкой
+        (с учётом Retry-After). Каждая попытка ждёт токен лимитера своего хоста,
+        и одновременно выполняется не больше max_concurrency запросов.
+        """
+        key = (method, url, json.dumps(kwargs.get('params'), sort_keys=True, default=str), str(kwargs.get('data')))
+        return await self.single_flight.run(key, lambda: self.send_with_retries(method, url, **kwargs))
+
+    async def send_with_retries(self, method: str, url: str, **kwargs):
+        session = await self.get_session()
+        limiter = self.limiters.get(urlsplit(url).hostname)
+
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt * (1 + random.random() / 2)
+            try:
+                if limiter is not None:
+                    await limiter.acquire()
+                async with self.semaphore:
+                    async with session.request(method, url, **kwargs) as response:
+                        if response.status in RETRY_STATUSES and attempt < self.retries:
+                            retry_after = response.headers.get('Retry-After', '')
+                            if retry_after.isdigit():
+                                delay = max(delay, float(retry_after))
+                        else:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+
+            await asyncio.sleep(delay)
+
+    async def get_json(self, url: str, **kwargs):
+        return await self.request_json('GET', url, **kwargs)
+
+    async def post_json(self, url: str, **kwargs):
+        return await self.request_json('POST', url, **kwargs)
+
+    def metrics(self) -> Dict:
+        """Время ожидания в очередях лимитеров по хостам и число объединённых запросов"""
+        return {
+            'upstreams': {host: limiter.stats() for host, limiter in self.limiters.items()},
+            'coalesced_requests': self.single_flight.coalesced,
+        }
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
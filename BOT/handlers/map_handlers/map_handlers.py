@@ -1,11 +1,22 @@
+import logging
+import os
+
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
-from .utils_for_map_handlers import get_top_5_places, format_results, address_to_coordinates
+from .http_client import MapHttpClient
+from .offline_index import OfflinePlacesIndex
+from .places_cache import PlaceTileCache
+from .utils_for_map_handlers import get_top_5_places, format_results, address_to_coordinates, \
+    parse_search_arguments, PlacesUnavailableError
+
+logger = logging.getLogger(__name__)
 
 
 class MapHandlers:
-    def __init__(self):
+    def __init__(self, database_of_geocodes=None, offline_index_path="./data/places_index", use_overpass_fallback=True,
+                 places_limit=5, start_radius=250, max_radius=3000, radius_step=2,
+                 nominatim_rate=1, overpass_rate=1, overpass_burst=2):
         self.base_url = "https://nominatim.openstreetmap.org/search"
         self.headers = {
             'User-Agent': 'MeetingFinderBot/1.0 (https://t.me/ai_test_helper_nsu_bot; artem.rt2020@mail.ru)',
@@ -13,6 +24,19 @@ class MapHandlers:
             'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8'
         }
         self.overpass_url = "http://overpass-api.de/api/interpreter"
+        # Nominatim разрешает не больше 1 запроса в секунду
+        self.http = MapHttpClient(headers=self.headers, rate_limits={
+            "nominatim.openstreetmap.org": (nominatim_rate, 1),
+            "overpass-api.de": (overpass_rate, overpass_burst),
+        })
+        self.geocode_cache = database_of_geocodes
+        self.places_cache = PlaceTileCache()
+        self.offline_index = OfflinePlacesIndex(offline_index_path) if os.path.isdir(offline_index_path) else None
+        self.use_overpass_fallback = use_overpass_fallback
+        self.places_limit = places_limit
+        self.start_radius = start_radius
+        self.max_radius = max_radius
+        self.radius_step = radius_step
         self.router = Router()
         self.register_handler()
 
@@ -20,14 +44,78 @@ class MapHandlers:
         self.router.message.register(self.cmd_find_nearest_places, Command("find_nearest_places"))
 
     async def cmd_find_nearest_places(self, message: Message):
-        address = message.text.replace("/find_nearest_places", "")
-        coords = await address_to_coordinates(self.base_url, self.headers,address)
+        try:
+            k, amenities, address = await parse_search_arguments(
+                message.text.replace("/find_nearest_places", ""), self.places_limit)
+        except ValueError as e:
+            await message.answer(f"❌ {e}")
+            return
+
+        coords = await address_to_coordinates(self.http, self.base_url, address, cache=self.geocode_cache)
         if not coords:
             await message.answer("Некорректный адрес")
             return
         lat, lng = coords
-        places = await get_top_5_places(self.overpass_url,lat, lng)
+
+        try:
+            places, radius = await self.search_places_adaptive(lat, lng, k, amenities)
+        except PlacesUnavailableError:
+            await message.answer("❌ Сервис поиска заведений сейчас недоступен, попробуйте позже")
+            return
         # print(places)
-        result_text = await format_results(places)
+        result_text = await format_results(places, radius)
         await message.answer(f"{result_text}", parse_mode="HTML")
-        return
\ No newline at end of file
+        return
+
+    async def find_places(self, lat, lng, radius, k, amenities):
+        """
+        Ищет в офлайн-индексе, а если там пусто - в Overpass. При наличии
+        индекса недоступность Overpass считается пустым ответом, чтобы поиск
+        мог расширить радиус по индексу.
+        """
+        places = []
+        if self.offline_index is not None:
+            places = await self.offline_index.nearest_places(lat, lng, k, radius, amenities)
+        if not places and self.use_overpass_fallback:
+            try:
+                places = await get_top_5_places(self.http, self.overpass_url, lat, lng, radius,
+                                                cache=self.places_cache, k=k, amenities=amenities)
+            except PlacesUnavailableError as e:
+                if self.offline_index is None:
+                    raise
+                logger.warning("Overpass недоступен, ищем только по офлайн-индексу: %s", e,
+                               extra={'radius': radius})
+        return places
+
+    async def search_places_adaptive(self, lat, lng, k, amenities=None):
+        """
+        Начинает с малого радиуса и расширяет его в radius_step раз, пока не
+        найдётся k заведений или не будет достигнут max_radius.
+
+        Радиус расширяется только после успешного, но недостаточного ответа:
+        при первой же ошибке источника поиск останавливается и возвращает
+        результат предыдущего радиуса, а если его нет - пробрасывает
+        PlacesUnavailableError.
+        """
+        radius = self.start_radius
+        found = None
+        while True:
+            try:
+                places = await self.find_places(lat, lng, radius, k, amenities)
+            except PlacesUnavailableError:
+                if found is None:
+                    raise
+                return found
+            found = places, radius
+            if len(places) >= k or radius >= self.max_radius:
+                return found
+            radius = min(radius * self.radius_step, self.max_radius)
+
+    def metrics(self):
+        return self.http.metrics()
+
+    async def close(self):
+        await self.http.close()
+        if self.offline_index is not None:
+            self.offline_index.close()
+            self.offline_index = None
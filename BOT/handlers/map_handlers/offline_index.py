@@ -0,0 +1,258 @@
+"""
+Офлайн-индекс заведений из локальной выгрузки OSM.
+
+Импорт:
+    python -m BOT.handlers.map_handlers.offline_index novosibirsk.osm.pbf ./data/places_index
+
+Поддерживаются JSON-ответ Overpass (out center), OSM XML (.osm) и, при
+установленном пакете osmium, .pbf. Индекс - равномерная сетка в градусах:
+точки отсортированы по ячейкам и лежат в .npy файлах, которые открываются
+через mmap, а теги читаются только для найденных мест.
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import xml.etree.ElementTree as ET
+from math import ceil, cos, radians
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from BOT.logging_config import setup_logging
+from .utils_for_map_handlers import AMENITIES, build_place_info, haversine_distances
+
+logger = logging.getLogger(__name__)
+
+KEPT_TAGS = ('name', 'amenity', 'addr:street', 'addr:housenumber', 'cuisine', 'website', 'phone', 'opening_hours')
+METERS_PER_DEGREE = 111320
+
+
+def keep_place(tags: Dict, amenities: List[str]) -> bool:
+    return 'name' in tags and tags.get('amenity') in amenities
+
+
+def read_overpass_json(path: str, amenities: List[str]) -> Iterator[Tuple[float, float, Dict]]:
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+
+    for element in data['elements']:
+        tags = element.get('tags', {})
+        if not keep_place(tags, amenities):
+            continue
+        point = element if element['type'] == 'node' else element.get('center', {})
+        if 'lat' in point and 'lon' in point:
+            yield point['lat'], point['lon'], tags
+
+
+def iter_osm_elements(path: str) -> Iterator[ET.Element]:
+    """
+    Элементы верхнего уровня (node, way, relation) с уже разобранными tag и nd.
+    После обработки элемент очищается и удаляется из корня, поэтому дерево не
+    растёт вместе с файлом.
+    """
+    root = None
+    depth = 0
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1:
+            yield element
+            element.clear()
+            root.clear()
+
+
+def read_osm_xml(path: str, amenities: List[str]) -> Iterator[Tuple[float, float, Dict]]:
+    """Два прохода: сначала заведения-линии и их узлы, затем заведения-точки и центры линий"""
+    way_nodes = {}
+    for element in iter_osm_elements(path):
+        if element.tag == 'way':
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            if keep_place(tags, amenities):
+                way_nodes[element.get('id')] = ([nd.get('ref') for nd in element.iter('nd')], tags)
+
+    needed = {ref for refs, _ in way_nodes.values() for ref in refs}
+    locations = {}
+    for element in iter_osm_elements(path):
+        if element.tag == 'node':
+            if element.get('id') in needed:
+                locations[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+
+            tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+            if keep_place(tags, amenities):
+                yield float(element.get('lat')), float(element.get('lon')), tags
+
+    for refs, tags in way_nodes.values():
+        points = [locations[ref] for ref in refs if ref in locations]
+        if points:
+            yield sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points), tags
+
+
+def read_osm_pbf(path: str, amenities: List[str]) -> Iterator[Tuple[float, float, Dict]]:
+    try:
+        import osmium
+    except ImportError as e:
+        raise RuntimeError("Для импорта .pbf установите пакет osmium") from e
+
+    places = []
+
+    class PlacesHandler(osmium.SimpleHandler):
+        def node(self, node):
+            tags = dict(node.tags)
+            if keep_place(tags, amenities):
+                places.append((node.location.lat, node.location.lon, tags))
+
+        def way(self, way):
+            tags = dict(way.tags)
+            if keep_place(tags, amenities):
+                points = [(nd.lat, nd.lon) for nd in way.nodes if nd.location.valid()]
+                if points:
+                    places.append((sum(p[0] for p in points) / len(points),
+                                   sum(p[1] for p in points) / len(points), tags))
+
+    PlacesHandler().apply_file(path, locations=True)
+    return iter(places)
+
+
+def read_places(path: str, amenities: List[str]) -> Iterator[Tuple[float, float, Dict]]:
+    if path.endswith('.json'):
+        return read_overpass_json(path, amenities)
+    if path.endswith('.pbf'):
+        return read_osm_pbf(path, amenities)
+    return read_osm_xml(path, amenities)
+
+
+def cell_keys(lats: np.ndarray, lons: np.ndarray, cell_size: float) -> np.ndarray:
+    rows = np.floor((lats + 90) / cell_size).astype(np.int64)
+    cols = np.floor((lons + 180) / cell_size).astype(np.int64)
+    return rows * ceil(360 / cell_size) + cols
+
+
+def build_index(source: str, out_dir: str, amenities: Optional[List[str]] = None, cell_size: float = 0.01) -> int:
+    """Строит индекс из выгрузки source в каталоге out_dir, возвращает число мест"""
+    amenities = amenities or AMENITIES.split('|')
+    places = list(read_places(source, amenities))
+
+    lats = np.array([place[0] for place in places], dtype=np.float64)
+    lons = np.array([place[1] for place in places], dtype=np.float64)
+    keys = cell_keys(lats, lons, cell_size)
+    order = np.argsort(keys, kind='stable')
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, 'keys.npy'), keys[order])
+    np.save(os.path.join(out_dir, 'coords.npy'), np.stack([lats[order], lons[order]], axis=1))
+    np.save(os.path.join(out_dir, 'amenities.npy'),
+            np.array([amenities.index(places[i][2]['amenity']) for i in order], dtype=np.uint8))
+
+    offsets = [0]
+    with open(os.path.join(out_dir, 'records.bin'), 'wb') as file:
+        for i in order:
+            tags = {key: value for key, value in places[i][2].items() if key in KEPT_TAGS}
+            record = json.dumps(tags, ensure_ascii=False).encode('utf-8')
+            file.write(record)
+            offsets.append(offsets[-1] + len(record))
+    np.save(os.path.join(out_dir, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+
+    with open(os.path.join(out_dir, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump({'cell_size': cell_size, 'amenities': amenities, 'count': len(places)}, file)
+
+    return len(places)
+
+
+class OfflinePlacesIndex:
+    """Поиск ближайших заведений по индексу, построенному build_index"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as file:
+            meta = json.load(file)
+
+        self.cell_size = meta['cell_size']
+        self.amenities = meta['amenities']
+        self.keys = np.load(os.path.join(path, 'keys.npy'), mmap_mode='r')
+        self.coords = np.load(os.path.join(path, 'coords.npy'), mmap_mode='r')
+        self.amenity_codes = np.load(os.path.join(path, 'amenities.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+
+        self.records_file = open(os.path.join(path, 'records.bin'), 'rb')
+        self.records = mmap.mmap(self.records_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self.offsets[-1] else b''
+
+    def candidates(self, latitude: float, longitude: float, radius: float) -> np.ndarray:
+        """Индексы точек из ячеек, пересекающих квадрат вокруг круга поиска"""
+        lat_delta = radius / METERS_PER_DEGREE
+        lon_delta = radius / (METERS_PER_DEGREE * max(cos(radians(latitude)), 0.01))
+
+        first = cell_keys(np.array([latitude - lat_delta]), np.array([longitude - lon_delta]), self.cell_size)[0]
+        last = cell_keys(np.array([latitude + lat_delta]), np.array([longitude + lon_delta]), self.cell_size)[0]
+        columns = ceil(360 / self.cell_size)
+
+        ranges = []
+        for row_start in range(first - first % columns, last + 1, columns):
+            start = np.searchsorted(self.keys, row_start + first % columns, side='left')
+            end = np.searchsorted(self.keys, row_start + last % columns, side='right')
+            if start < end:
+                ranges.append(np.arange(start, end))
+
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def nearest(self, latitude: float, longitude: float, k: int = 5, radius: float = 1000,
+                amenities: Optional[List[str]] = None) -> List[Tuple[Dict, float, float, float]]:
+        """k ближайших мест в радиусе: список (теги, широта, долгота, расстояние)"""
+        indices = self.candidates(latitude, longitude, radius)
+        if amenities is not None and len(indices):
+            codes = [self.amenities.index(amenity) for amenity in amenities if amenity in self.amenities]
+            indices = indices[np.isin(self.amenity_codes[indices], codes)]
+
+        if not len(indices):
+            return []
+
+        coords = self.coords[indices]
+        distances = haversine_distances(latitude, longitude, coords[:, 0], coords[:, 1])
+        inside = distances <= radius
+        indices, coords, distances = indices[inside], coords[inside], distances[inside]
+
+        if len(distances) > k:
+            best = np.argpartition(distances, k)[:k]
+        else:
+            best = np.arange(len(distances))
+        best = best[np.argsort(distances[best])]
+
+        result = []
+        for i in best:
+            record = self.records[self.offsets[indices[i]]:self.offsets[indices[i] + 1]]
+            result.append((json.loads(record), float(coords[i, 0]), float(coords[i, 1]), float(distances[i])))
+        return result
+
+    async def nearest_places(self, latitude: float, longitude: float, k: int = 5, radius: float = 1000,
+                             amenities: Optional[List[str]] = None) -> List[Dict]:
+        """То же, что nearest, но в формате parse_osm_data"""
+        return [await build_place_info(tags, lat, lon, distance)
+                for tags, lat, lon, distance in self.nearest(latitude, longitude, k, radius, amenities)]
+
+    def close(self):
+        if isinstance(self.records, mmap.mmap):
+            self.records.close()
+        self.records_file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Импорт заведений из выгрузки OSM в офлайн-индекс')
+    parser.add_argument('source', help='файл .json (Overpass), .osm (XML) или .pbf')
+    parser.add_argument('out_dir', help='каталог индекса, например ./data/places_index')
+    parser.add_argument('--amenities', default=AMENITIES, help='типы заведений через |')
+    parser.add_argument('--cell-size', type=float, default=0.01, help='размер ячейки сетки в градусах')
+    args = parser.parse_args()
+
+    setup_logging(fmt='text')
+    count = build_index(args.source, args.out_dir, args.amenities.split('|'), args.cell_size)
+    logger.info("✅ Проиндексировано мест: %d", count, extra={'out_dir': args.out_dir})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class PlaceTileCache:
+    """Кэш сырых элементов Overpass по geohash-тайлам с временем жизни"""
+
+    def __init__(self, ttl: int = 6 * 3600, precision: int = 6, max_tiles: int = 4096):
+        self.ttl = ttl
+        self.precision = precision
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+
+    def get(self, tile: str) -> Optional[List[Dict]]:
+        entry = self.tiles.get(tile)
+        if entry is None:
+            return None
+
+        expires_at, elements = entry
+        if expires_at <= time.time():
+            del self.tiles[tile]
+            return None
+
+        self.tiles.move_to_end(tile)
+        return elements
+
+    def put(self, tile: str, elements: List[Dict]):
+        self.tiles[tile] = (time.time() + self.ttl, elements)
+        self.tiles.move_to_end(tile)
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
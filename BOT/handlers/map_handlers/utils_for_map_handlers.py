@@ -1,16 +1,90 @@
-from math import radians, sin, cos, sqrt, atan2
+import asyncio
+import logging
 from typing import List, Dict, Optional, Tuple
 
 import aiohttp
-import requests
+import numpy as np
 
+from .geohash import bounding_box, encode, tiles_in_radius
+from .http_client import MapHttpClient
+from .places_cache import PlaceTileCache
 
-async def address_to_coordinates(base_url,headers,address: str, city: str = "") -> Optional[Tuple[float, float]]:
-    """АСИНХРОННАЯ версия с aiohttp"""
+logger = logging.getLogger(__name__)
+
+AMENITIES = "cafe|restaurant|bar|pub|fast_food|biergarten"
+
+CATEGORY_ALIASES = {
+    'кафе': 'cafe',
+    'ресторан': 'restaurant',
+    'бар': 'bar',
+    'паб': 'pub',
+    'фастфуд': 'fast_food',
+    'пивной_сад': 'biergarten',
+}
+
+MAX_PLACES = 10
+
+
+class PlacesUnavailableError(Exception):
+    """Overpass не ответил: в отличие от пустого результата, расширять радиус бессмысленно"""
+
+
+async def parse_search_arguments(text: str, default_k: int) -> Tuple[int, Optional[List[str]], str]:
+    """
+    Разбирает аргументы /find_nearest_places: необязательные k=N и типы=кафе,бар
+    в начале, затем адрес.
+
+    Raises:
+        ValueError: с сообщением для пользователя при некорректных параметрах
+    """
+    k, amenities = default_k, None
+    words = text.split()
+
+    while words and '=' in words[0]:
+        key, value = words.pop(0).split('=', 1)
+        key = key.lower()
+
+        if key in ('k', 'количество'):
+            if not value.isdigit() or not 1 <= int(value) <= MAX_PLACES:
+                raise ValueError(f"Количество заведений должно быть от 1 до {MAX_PLACES}")
+            k = int(value)
+        elif key in ('типы', 'types'):
+            amenities = []
+            for category in value.lower().split(','):
+                amenity = CATEGORY_ALIASES.get(category, category)
+                if amenity not in AMENITIES.split('|'):
+                    raise ValueError(f"Неизвестный тип заведения: {category}. Доступны: "
+                                     f"{', '.join(CATEGORY_ALIASES)}")
+                amenities.append(amenity)
+        else:
+            raise ValueError(f"Неизвестный параметр: {key}")
+
+    return k, amenities, ' '.join(words)
+
+
+
+async def address_to_coordinates(client: MapHttpClient, base_url, address: str, city: str = "",
+                                 cache=None) -> Optional[Tuple[float, float]]:
+    """
+    Геокодирует адрес через Nominatim, используя общую сессию client.
+
+    Если передан cache (GeocodeCacheDB), повторные адреса берутся из него,
+    а ответы Nominatim, включая пустые, сохраняются в него. Сетевые ошибки
+    не кэшируются.
+    """
     full_address = address
     if city and city not in address:
         full_address += f", {city}"
 
+    if cache is not None:
+        try:
+            found, coords = await cache.get_coordinates(full_address)
+            if found:
+                return coords
+        except Exception as e:
+            # Кэш только ускоряет ответ: при ошибке базы идём в Nominatim
+            logger.warning("Ошибка чтения кэша геокодирования: %s", e, extra={'address': address})
+
     params = {
         'q': full_address,
         'format': 'json',
@@ -20,29 +94,23 @@ async def address_to_coordinates(base_url,headers,address: str, city: str = "")
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                    base_url,
-                    params=params,
-                    headers=headers,
-                    timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-
-                if response.status == 200:
-                    data = await response.json()
-                    if data:
-                        first_result = data[0]
-                        lat = float(first_result['lat'])
-                        lon = float(first_result['lon'])
-                        return lat, lon
-                else:
-                    print(f"❌ HTTP ошибка: {response.status}")
-                    return None
+        data = await client.get_json(base_url, params=params)
+        coords = None
+        if data:
+            first_result = data[0]
+            coords = float(first_result['lat']), float(first_result['lon'])
 
     except Exception as e:
-        print(f"❌ Ошибка: {e}")
+        logger.warning("Ошибка геокодирования: %s", e, extra={'address': address})
         return None
 
+    if cache is not None:
+        try:
+            await cache.save_coordinates(full_address, coords)
+        except Exception as e:
+            logger.warning("Ошибка записи в кэш геокодирования: %s", e, extra={'address': address})
+    return coords
+
 
 async def format_address(tags: Dict) -> str:
     """Форматирует адрес из OSM тегов"""
@@ -55,25 +123,30 @@ async def format_address(tags: Dict) -> str:
 
     return ', '.join(address_parts) if address_parts else 'Адрес не указан'
 
-async def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Рассчитывает расстояние между точками в метрах"""
-    R = 6371000  # Радиус Земли в метрах
-
-    # Конвертируем градусы в радианы
-    lat1_rad = radians(lat1)
-    lon1_rad = radians(lon1)
-    lat2_rad = radians(lat2)
-    lon2_rad = radians(lon2)
-
-    # Разница координат
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-
-    # Формула гаверсинуса
-    a = sin(dlat / 2) ** 2 + cos(lat1_rad) * cos(lat2_rad) * sin(dlon / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-    return R * c
+def haversine_distances(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Векторно рассчитывает расстояния в метрах от точки до массива точек"""
+    lat_rad = np.radians(lat)
+    lats_rad = np.radians(lats)
+    dlat = lats_rad - lat_rad
+    dlon = np.radians(lons) - np.radians(lon)
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_rad) * np.cos(lats_rad) * np.sin(dlon / 2) ** 2
+    return 2 * 6371000 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+async def build_place_info(tags: Dict, place_lat: float, place_lon: float, distance: float) -> Dict:
+    """Формирует информацию о месте из OSM тегов"""
+    return {
+        'name': tags['name'],
+        'type': tags.get('amenity', 'place'),
+        'address': await format_address(tags),
+        'cuisine': tags.get('cuisine', ''),
+        'website': tags.get('website', ''),
+        'phone': tags.get('phone', ''),
+        'opening_hours': tags.get('opening_hours', ''),
+        'latitude': place_lat,
+        'longitude': place_lon,
+        'distance': distance
+    }
 
 async def get_coordinates(element: Dict) -> tuple:
     """Извлекает координаты из OSM элемента"""
@@ -83,83 +156,133 @@ async def get_coordinates(element: Dict) -> tuple:
         center = element.get('center', {})
         return center.get('lat'), center.get('lon')
 
-async def parse_osm_data(data: Dict, user_lat: float, user_lon: float) -> List[Dict]:
-    """Парсит данные из OSM response"""
-    places = []
-
-    for element in data['elements']:
-        tags = element.get('tags', {})
-
-        # Пропускаем если нет названия
-        if 'name' not in tags:
-            continue
-
-        # Получаем координаты места
-        place_lat, place_lon = await get_coordinates(element)
-        if not place_lat or not place_lon:
-            continue
-
-        # Рассчитываем расстояние
-        distance = await calculate_distance(user_lat, user_lon, place_lat, place_lon)
-
-        # Формируем информацию о месте
-        place_info = {
-            'name': tags['name'],
-            'type': tags.get('amenity', 'place'),
-            'address': await format_address(tags),
-            'cuisine': tags.get('cuisine', ''),
-            'website': tags.get('website', ''),
-            'phone': tags.get('phone', ''),
-            'opening_hours': tags.get('opening_hours', ''),
-            'latitude': place_lat,
-            'longitude': place_lon,
-            'distance': distance
-        }
-
-        places.append(place_info)
+async def parse_osm_data(data: Dict, user_lat: float, user_lon: float, k: int = 5,
+                         radius: Optional[float] = None, amenities: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Парсит данные из OSM response и возвращает k ближайших мест
 
-    return places
+    Расстояния считаются одним векторным вызовом, лучшие k выбираются через
+    argpartition, и полная информация собирается только для них.
+    """
+    # Пропускаем если нет названия или тип не запрошен
+    elements = [
+        element for element in data['elements']
+        if 'name' in element.get('tags', {}) and (amenities is None or element['tags'].get('amenity') in amenities)
+    ]
+    if not elements:
+        return []
 
-async def get_top_5_places(overpass_url,latitude: float, longitude: float, radius: int = 1000) -> List[Dict]:
+    # Координаты места: у точки свои, у линии или отношения - центр
+    points = [element if element['type'] == 'node' else element.get('center', {}) for element in elements]
+    lats = np.array([point.get('lat') or np.nan for point in points], dtype=np.float64)
+    lons = np.array([point.get('lon') or np.nan for point in points], dtype=np.float64)
+
+    distances = haversine_distances(user_lat, user_lon, lats, lons)
+    valid = np.isfinite(distances)
+    if radius is not None:
+        valid &= distances <= radius
+
+    candidates = np.flatnonzero(valid)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(distances[candidates], k)[:k]]
+    candidates = candidates[np.argsort(distances[candidates])]
+
+    return [await build_place_info(elements[i]['tags'], float(lats[i]), float(lons[i]), float(distances[i]))
+            for i in candidates]
+
+async def get_tile_elements(client: MapHttpClient, overpass_url, latitude: float, longitude: float, radius: int,
+                            cache: PlaceTileCache) -> List[Dict]:
+    """Собирает элементы из тайлов вокруг точки, догружая из Overpass только отсутствующие в кэше"""
+    tiles = tiles_in_radius(latitude, longitude, radius, cache.precision)
+    # Повторно кэш не читаем: тайл может истечь, пока ждём Overpass
+    cached = {tile: cache.get(tile) for tile in tiles}
+    missing = [tile for tile, elements in cached.items() if elements is None]
+
+    if missing:
+        boxes = []
+        for tile in missing:
+            south, west, north, east = bounding_box(tile)
+            boxes.append(f'nwr["amenity"~"{AMENITIES}"]({south},{west},{north},{east});')
+
+        overpass_query = f"""
+        [out:json][timeout:10];
+        (
+          {"".join(boxes)}
+        );
+        out center;
+        """
+        data = await client.post_json(overpass_url, data=overpass_query,
+                                      timeout=aiohttp.ClientTimeout(total=20))
+
+        fetched = {tile: [] for tile in missing}
+        for element in data['elements']:
+            place_lat, place_lon = await get_coordinates(element)
+            if place_lat is None or place_lon is None:
+                continue
+            tile = encode(place_lat, place_lon, cache.precision)
+            if tile in fetched:
+                fetched[tile].append(element)
+
+        for tile, elements in fetched.items():
+            cache.put(tile, elements)
+        cached.update(fetched)
+
+    elements = []
+    for tile in tiles:
+        elements.extend(cached[tile])
+    return elements
+
+async def get_top_5_places(client: MapHttpClient, overpass_url, latitude: float, longitude: float,
+                           radius: int = 1000, cache: Optional[PlaceTileCache] = None, k: int = 5,
+                           amenities: Optional[List[str]] = None) -> List[Dict]:
     """
-    Получает 5 лучших ближайших заведений через OpenStreetMap
+    Получает k (по умолчанию 5) лучших ближайших заведений через OpenStreetMap
 
     Args:
+        client: Общий HTTP-клиент
         latitude: Широта
         longitude: Долгота
         radius: Радиус поиска в метрах (по умолчанию 1 км)
+        cache: Кэш тайлов; если передан, Overpass запрашивается только для недостающих тайлов
+        k: Сколько заведений вернуть
+        amenities: Типы заведений (по умолчанию все из AMENITIES)
 
     Returns:
-        List[Dict]: Список из 5 заведений с информацией
+        List[Dict]: Список из k заведений с информацией
+
+    Raises:
+        PlacesUnavailableError: если Overpass недоступен или вернул некорректный ответ
     """
+    amenity_filter = '|'.join(amenities) if amenities else AMENITIES
+
     # Overpass QL запрос для поиска заведений
     overpass_query = f"""
     [out:json][timeout:5];
     (
-      node["amenity"~"cafe|restaurant|bar|pub|fast_food|biergarten"]
+      node["amenity"~"{amenity_filter}"]
         (around:{radius},{latitude},{longitude});
-      way["amenity"~"cafe|restaurant|bar|pub|fast_food|biergarten"]
+      way["amenity"~"{amenity_filter}"]
         (around:{radius},{latitude},{longitude});
-      relation["amenity"~"cafe|restaurant|bar|pub|fast_food|biergarten"]
+      relation["amenity"~"{amenity_filter}"]
         (around:{radius},{latitude},{longitude});
     );
     out center;
     """
 
     try:
-        # Отправляем запрос к OSM API
-        response = requests.post(overpass_url, data=overpass_query)
-        response.raise_for_status()
-
-        data = response.json()
-        places = await parse_osm_data(data, latitude, longitude)
+        if cache is None:
+            # Отправляем запрос к OSM API
+            data = await client.post_json(overpass_url, data=overpass_query,
+                                          timeout=aiohttp.ClientTimeout(total=15))
+        else:
+            data = {'elements': await get_tile_elements(client, overpass_url, latitude, longitude, radius, cache)}
 
-        # Берем топ-5 ближайших
-        return sorted(places, key=lambda x: x['distance'])[:5]
+        # Берем топ-k ближайших в радиусе
+        return await parse_osm_data(data, latitude, longitude, k, radius, amenities)
 
-    except Exception as e:
-        print(f"Ошибка при запросе к OSM: {e}")
-        return []
+    except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+        logger.warning("Ошибка при запросе к OSM: %s", e)
+        raise PlacesUnavailableError(str(e)) from e
 
 async def get_place_emoji(place_type: str) -> str:
     """Возвращает эмодзи в зависимости от типа заведения"""
@@ -173,11 +296,12 @@ async def get_place_emoji(place_type: str) -> str:
     }
     return emoji_map.get(place_type, '🏢')
 
-async def format_results(places: List[Dict]) -> str:
+async def format_results(places: List[Dict], radius: int = 1000) -> str:
     if not places:
-        return "❌ В радиусе 1 км не найдено заведений"
+        radius_str = f"{radius / 1000:g} км" if radius >= 1000 else f"{radius} м"
+        return f"❌ В радиусе {radius_str} не найдено заведений"
 
-    result = ["📍 <b>Топ-5 ближайших заведений:</b>\n"]
+    result = [f"📍 <b>Топ-{len(places)} ближайших заведений:</b>\n"]
 
     for i, place in enumerate(places, 1):
         emoji = await get_place_emoji(place['type'])
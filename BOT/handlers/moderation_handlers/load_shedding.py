@@ -0,0 +1,100 @@
+import logging
+import random
+import time
+from typing import Sequence
+
+logger = logging.getLogger(__name__)
+
+# Режимы модерации по мере роста нагрузки
+NORMAL = 0          # токсичность и соответствие теме
+NO_TOPIC = 1        # только токсичность
+SAMPLE = 2          # токсичность для доли сообщений
+PASS_THROUGH = 3    # сообщения не проверяются
+
+MODE_NAMES = {NORMAL: 'normal', NO_TOPIC: 'no_topic', SAMPLE: 'sample', PASS_THROUGH: 'pass_through'}
+
+
+class LoadShedder:
+    """
+    Контроль допуска для проверки сообщений.
+
+    Нагрузка оценивается по числу сообщений, ждущих моделей, и по возрасту
+    сообщения (сколько прошло с его отправки). queue_depths[i] и message_ages[i] -
+    пороги перехода в режим i + 1: режим сразу поднимается до самого высокого
+    превышенного порога, а опускается по одной ступени, когда нагрузка упала ниже
+    recovery_ratio от порога текущего режима и продержалась так recovery_seconds.
+    """
+
+    def __init__(self, queue_depths: Sequence[int] = (8, 32, 128), message_ages: Sequence[float] = (5, 15, 60),
+                 sample_rate: float = 0.2, recovery_ratio: float = 0.5, recovery_seconds: float = 10, metrics=None):
+        self.queue_depths = tuple(queue_depths)
+        self.message_ages = tuple(message_ages)
+        self.sample_rate = sample_rate
+        self.recovery_ratio = recovery_ratio
+        self.recovery_seconds = recovery_seconds
+
+        self.mode = NORMAL
+        self.calm_since = None
+        self.transitions = 0
+
+        self.metrics = metrics
+        if metrics is not None:
+            self.mode_gauge = metrics.registry.gauge('moderation_mode', 'Режим модерации: 0 - полный, 3 - без проверок')
+            self.shed_counter = metrics.registry.counter('moderation_shed_total', 'Пропущенные проверки сообщений')
+            self.mode_gauge.set(self.mode)
+
+    def pressure_level(self, depth: int, age: float, ratio: float = 1.0) -> int:
+        """Самый высокий режим, порог которого (умноженный на ratio) превышен"""
+        level = NORMAL
+        for i, (max_depth, max_age) in enumerate(zip(self.queue_depths, self.message_ages)):
+            if depth >= max_depth * ratio or age >= max_age * ratio:
+                level = i + 1
+        return level
+
+    def observe(self, depth: int, age: float) -> int:
+        """Учитывает текущую нагрузку и возвращает режим для очередного сообщения"""
+        now = time.monotonic()
+        level = self.pressure_level(depth, age)
+
+        if level > self.mode:
+            self.set_mode(level, depth, age)
+            self.calm_since = None
+        elif self.mode > NORMAL and self.pressure_level(depth, age, self.recovery_ratio) < self.mode:
+            if self.calm_since is None:
+                self.calm_since = now
+            elif now - self.calm_since >= self.recovery_seconds:
+                self.set_mode(self.mode - 1, depth, age)
+                self.calm_since = now
+        else:
+            self.calm_since = None
+
+        return self.mode
+
+    def set_mode(self, mode: int, depth: int, age: float):
+        logger.warning("Режим модерации: %s -> %s", MODE_NAMES[self.mode], MODE_NAMES[mode],
+                       extra={'queue_depth': depth, 'message_age': round(age, 3)})
+        self.mode = mode
+        self.transitions += 1
+        if self.metrics is not None:
+            self.mode_gauge.set(mode)
+
+    def check_toxicity(self, mode: int) -> bool:
+        if mode == NORMAL or mode == NO_TOPIC:
+            return True
+        if mode == SAMPLE and random.random() < self.sample_rate:
+            return True
+        self.record_shed('toxicity', mode)
+        return False
+
+    def check_topic(self, mode: int) -> bool:
+        if mode == NORMAL:
+            return True
+        self.record_shed('topic', mode)
+        return False
+
+    def record_shed(self, check: str, mode: int):
+        if self.metrics is not None:
+            self.shed_counter.inc(check=check, mode=MODE_NAMES[mode])
+
+    def stats(self):
+        return {'mode': self.mode, 'transitions': self.transitions}
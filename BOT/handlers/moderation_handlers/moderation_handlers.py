@@ -1,17 +1,39 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from BOT.outbound import PRIORITY_WARNING, outbound
+from .load_shedding import LoadShedder
 from .utils_for_moderator import check_similarity_of_the_mes_and_top, send_private_warning, toxicity_testing
 
+EMBEDDING_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+TOXICITY_MODEL = 'cointegrated/rubert-tiny-toxicity'
+
+
+def load_models():
+    """Загружает модели модерации: (модель эмбеддингов, модель токсичности, токенизатор)"""
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    toxicity_model = AutoModelForSequenceClassification.from_pretrained(TOXICITY_MODEL)
+    tokenizer = AutoTokenizer.from_pretrained(TOXICITY_MODEL)
+    return model, toxicity_model, tokenizer
+
 
 class ModerationHandlers:
-    def __init__(self, bot, database_of_messages):
+    def __init__(self, bot, database_of_messages, metrics=None, load_shedder=None, models=None):
         self.bot = bot
-        self.model = SentenceTransformer('sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
-        self.model2 = AutoModelForSequenceClassification.from_pretrained('cointegrated/rubert-tiny-toxicity')
-        self.tokenizer = AutoTokenizer.from_pretrained('cointegrated/rubert-tiny-toxicity')
+        self.metrics = metrics
+        self.load_shedder = load_shedder or LoadShedder(metrics=metrics)
+        # Модели работают в отдельном потоке, чтобы не блокировать event loop;
+        # pending - сколько вызовов моделей сейчас ждут этот поток или выполняются в нём
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='moderation')
+        self.pending = 0
+        # models можно загрузить заранее (load_models) и передать, например, из общего для воркеров процесса
+        self.model, self.model2, self.tokenizer = models or load_models()
         self.confidence_threshold = 0.35
         self.database = database_of_messages
         self.router = Router()
@@ -22,6 +44,31 @@ class ModerationHandlers:
         self.router.message.register(self.check_mes, ~F.command)
 
 
+    @staticmethod
+    def timed_call(function, *args):
+        """Выполняется в потоке моделей: результат и время инференса без ожидания в очереди"""
+        started = time.perf_counter()
+        result = function(*args)
+        return result, time.perf_counter() - started
+
+    async def run_model(self, model_name, function, *args):
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            result, seconds = await loop.run_in_executor(self.executor, self.timed_call, function, *args)
+        finally:
+            self.pending -= 1
+        # Гистограмма пишется в потоке event loop, где её читает /metrics
+        if self.metrics is not None:
+            self.metrics.inference(model_name, seconds)
+        return result
+
+    def stats(self):
+        return {'queue_depth': self.pending, 'mode_transitions': self.load_shedder.transitions}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
     async def cmd_set_topic(self, message: Message):
         await self.database.delete_message_from_chat(message.chat.id)
         text = message.text.replace("/set_topic", "").rstrip().lstrip()
@@ -34,8 +81,19 @@ class ModerationHandlers:
         await message.answer(f"Вы установили новую тему: {text}")
 
     async def check_mes(self, message: Message):
+        age = max(0.0, time.time() - message.date.timestamp())
+        mode = self.load_shedder.observe(self.pending, age)
+        check_toxicity = self.load_shedder.check_toxicity(mode)
+        check_topic = check_toxicity and self.load_shedder.check_topic(mode)
+        await self.moderate(message, check_toxicity, check_topic)
 
-        if any(toxicity_testing(message.text,self.model2, self.tokenizer) > 0.6):
+    async def moderate(self, message: Message, check_toxicity: bool = True, check_topic: bool = True):
+        """
+        Сообщения, проверки которых пропущены под нагрузкой, в контекст темы не
+        сохраняются: иначе по ним сравнивались бы следующие сообщения.
+        """
+        if check_toxicity and any(
+                await self.run_model('toxicity', toxicity_testing, message.text, self.model2, self.tokenizer) > 0.6):
             await message.delete()
             warning_text2 = (
                 f"👮‍♂️ <b>Помошник из чата \"{message.chat.title}\"</b>\n\n"
@@ -43,15 +101,18 @@ class ModerationHandlers:
                 f"<b>Причина:</b> деструктивное сообщение\n\n"
                 f"Пожалуйста, не используйте нецензурную брань."
             )
-            await self.bot.send_message(message.from_user.id,warning_text2, parse_mode="HTML")
+            with outbound(priority=PRIORITY_WARNING, coalesce_key=('warning', 'toxic', message.from_user.id)):
+                await self.bot.send_message(message.from_user.id,warning_text2, parse_mode="HTML")
             return
 
         if len(message.text.split()) < 3:
             return
 
-        if not await check_similarity_of_the_mes_and_top(message.chat.id, message.text, self.database, self.model, self.confidence_threshold):
-            await send_private_warning(self.bot, message.from_user.id, message.text, message.chat.title, message.chat.id)
+        if check_topic and not await check_similarity_of_the_mes_and_top(
+                message.chat.id, message.text, self.database, self.model, self.confidence_threshold, self.run_model):
             await message.delete()
+            await send_private_warning(self.bot, message.from_user.id, message.text, message.chat.title, message.chat.id)
             return
 
-        await self.database.save_message(message.chat.id, message.text)
\ No newline at end of file
+        if check_toxicity and check_topic:
+            await self.database.save_message(message.chat.id, message.text)
@@ -0,0 +1,18 @@
+"""
+Модели модерации, загруженные при импорте модуля.
+
+ShardedBotPool с preload_models=True запускает воркеры через forkserver и
+импортирует этот модуль в процессе forkserver заранее. Воркеры получаются
+fork'ом от него, поэтому веса моделей лежат в страницах, общих для всех
+воркеров (copy-on-write), и в памяти присутствуют один раз.
+"""
+import gc
+
+from .moderation_handlers import load_models
+
+MODELS = load_models()
+
+# Объекты, созданные до fork, переносятся в постоянное поколение: сборщик мусора
+# воркера не будет их обходить и переписывать их заголовки, копируя общие страницы
+gc.collect()
+gc.freeze()
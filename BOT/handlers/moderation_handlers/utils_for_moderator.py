@@ -1,8 +1,12 @@
+import logging
 from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+from BOT.outbound import PRIORITY_WARNING, outbound
 from sklearn.metrics.pairwise import cosine_similarity
 import torch
 
+logger = logging.getLogger(__name__)
+
 async def send_private_warning(bot: Bot, user_id: int, original_message: str, chat_title: str, chat_id: int):
     try:
         text = original_message if len(original_message) < 20 else original_message[:20] + "..."
@@ -14,33 +18,45 @@ async def send_private_warning(bot: Bot, user_id: int, original_message: str, ch
             f"Пожалуйста, придерживайтесь основной темы обсуждения."
         )
 
-        await bot.send_message(chat_id=user_id, text=warning_text, parse_mode="HTML")
+        # Повторные предупреждения одному пользователю во время волны спама склеиваются в одно
+        with outbound(priority=PRIORITY_WARNING, coalesce_key=('warning', 'off_topic', user_id)):
+            await bot.send_message(chat_id=user_id, text=warning_text, parse_mode="HTML")
     except TelegramForbiddenError:
-        print(f"User {user_id} not found or blocked the bot")
+        logger.info("Пользователь не найден или заблокировал бота", extra={'user_id': user_id})
     except TelegramRetryAfter as e:
-        print(f"Flood control.")
+        logger.warning("Flood control: предупреждение не отправлено",
+                       extra={'user_id': user_id, 'retry_after': e.retry_after})
+        return
     except Exception as e:
-        print(f"Failed to send warning to {user_id}: {e}")
+        logger.warning("Не удалось отправить предупреждение: %s", e, extra={'user_id': user_id})
         try:
             await bot.send_message(
                 chat_id=chat_id,
                 text=f"⚠️ Не удалось отправить предупреждение пользователю"
             )
         except Exception as inner_e:
-            print(f"Also failed to send error notification: {inner_e}")
+            logger.warning("Не удалось отправить уведомление об ошибке: %s", inner_e, extra={'chat_id': chat_id})
+
+async def run_inline(model_name, function, *args):
+    return function(*args)
+
 
-async def check_similarity_of_the_mes_and_top(chat_id: int, text: str, database, model, confidence_threshold: float):
+async def check_similarity_of_the_mes_and_top(chat_id: int, text: str, database, model, confidence_threshold: float,
+                                              run_model=run_inline):
     context = await database.get_last_messages(chat_id)
     if len(context) == 0:
         return True
 
     context = ','.join([message[0] for message in context])
 
-    embedding_context = model.encode([context])
+    # Контекст и сообщение кодируются одним батчем
+    embeddings = await run_model('embedding', model.encode, [context, text])
 
-    print(cosine_similarity(model.encode([text]), embedding_context)[0][0])
+    similarity = cosine_similarity(embeddings[1:], embeddings[:1])[0][0]
+    # Пишется на каждое сообщение, поэтому уровень DEBUG с выборкой (LOG_DEBUG_SAMPLE_RATE)
+    logger.debug("Схожесть сообщения с темой", extra={'chat_id': chat_id, 'similarity': float(similarity)})
 
-    if cosine_similarity(model.encode([text]), embedding_context)[0][0] > confidence_threshold:
+    if similarity > confidence_threshold:
         return True
 
     return False
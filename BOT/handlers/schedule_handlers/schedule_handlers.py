@@ -1,7 +1,8 @@
 from aiogram import Router, Bot
 from aiogram.filters import Command
 from aiogram.types import Message
-from BOT.handlers.schedule_handlers.utils_for_schedule_handlers import validate_time, print_free_time, validate_date
+from BOT.handlers.schedule_handlers.utils_for_schedule_handlers import validate_time, print_free_time, validate_date, \
+    print_quorum_free_time, parse_time, FREQUENCIES
 
 
 class ScheduleHandlers:
@@ -17,6 +18,8 @@ class ScheduleHandlers:
         self.router.message.register(self.cmd_find_free_time, Command("find_free_time"))
         self.router.message.register(self.cmd_schedule_add, Command("schedule_add"))
         self.router.message.register(self.cmd_schedule_delete, Command("schedule_delete"))
+        self.router.message.register(self.cmd_schedule_add_recurring, Command("schedule_add_recurring"))
+        self.router.message.register(self.cmd_schedule_skip, Command("schedule_skip"))
 
     async def cmd_schedule(self, message: Message):
         text = message.text.replace("/schedule", "").rstrip().lstrip()
@@ -47,8 +50,38 @@ class ScheduleHandlers:
             return
         chat_users = [user[0] for user in chat_users]
         # print(chat_users)
-        cells_time_users = await self.database.find_common_free_time(chat_users, 7)
-        await print_free_time(self.bot, chat_id, cells_time_users)
+
+        args = message.text.split()[1:]
+        if not args:
+            cells_time_users = await self.database.find_common_free_time(chat_users, 7)
+            await print_free_time(self.bot, chat_id, cells_time_users)
+            return
+
+        if len(args) > 3:
+            await message.answer("❌ Слишком много параметров. Используйте: /find_free_time участники минуты "
+                                 "количество-окон")
+            return
+
+        try:
+            numbers = [int(arg) for arg in args]
+        except ValueError:
+            await message.answer("❌ Параметры должны быть целыми числами, посмотрите пример")
+            return
+
+        min_users = numbers[0]
+        min_duration = numbers[1] if len(numbers) > 1 else 0
+        top = numbers[2] if len(numbers) > 2 else 5
+
+        if not 1 <= min_users <= len(chat_users):
+            await message.answer(f"❌ Количество участников должно быть от 1 до {len(chat_users)}")
+            return
+
+        if min_duration < 0 or top < 1:
+            await message.answer("❌ Длительность не может быть отрицательной, а количество окон должно быть больше 0")
+            return
+
+        windows = await self.database.find_quorum_free_time(chat_users, 7, min_users, min_duration, top)
+        await print_quorum_free_time(self.bot, chat_id, windows, len(chat_users))
 
     async def cmd_schedule_add(self, message: Message):
         try:
@@ -86,6 +119,72 @@ class ScheduleHandlers:
         except Exception as e:
             await message.answer(f"❌ Ошибка {str(e)}")
 
+    async def cmd_schedule_add_recurring(self, message: Message):
+        try:
+            arr_of_arg = message.text.split(' ', 6)
+            if len(arr_of_arg) < 7:
+                await message.answer("Недостаточно аргументов, посмотрите пример")
+                return
+
+            _, frequency, start_date, end_date, start_time, end_time, activity = arr_of_arg
+
+            if frequency.lower() not in FREQUENCIES:
+                await message.answer("❌ Периодичность должна быть 'ежедневно' или 'еженедельно'")
+                return
+
+            if not await validate_date(start_date) or not await validate_date(end_date):
+                await message.answer("❌ Неправильный формат даты. Используйте ГГГГ-ММ-ДД или 'сегодня', 'завтра'")
+                return
+
+            if not await validate_time(start_time) or not await validate_time(end_time):
+                await message.answer("❌ Неправильный формат времени. Используйте ЧЧ:ММ")
+                return
+
+            start_date = await parse_time(start_date)
+            end_date = await parse_time(end_date)
+
+            success, result_message = await self.database.add_recurring_activity(
+                message.from_user.id, FREQUENCIES[frequency.lower()], start_date, end_date, start_time, end_time,
+                activity)
+
+            if success:
+                response = (
+                    f"✅ <b>Повторяющееся занятие добавлено!</b>\n\n"
+                    f"🔁 <b>Повтор:</b> {frequency}\n"
+                    f"📅 <b>Период:</b> {start_date} - {end_date}\n"
+                    f"⏰ <b>Время:</b> {start_time} - {end_time}\n"
+                    f"🎯 <b>Занятие:</b> {activity}"
+                )
+
+            else:
+                response = result_message
+
+            await message.answer(response, parse_mode="html")
+
+        except Exception as e:
+            await message.answer(f"❌ Ошибка {str(e)}")
+
+    async def cmd_schedule_skip(self, message: Message):
+        arr_of_arg = message.text.split(' ', 2)
+        if len(arr_of_arg) < 3:
+            await message.answer("Недостаточно аргументов, посмотрите пример")
+            return
+
+        _, date, name_activity = arr_of_arg
+
+        if not await validate_date(date):
+            await message.answer("❌ Неправильный формат даты. Используйте ГГГГ-ММ-ДД или 'сегодня', 'завтра'")
+            return
+
+        date = await parse_time(date)
+        skipped = await self.database.add_recurring_exception(message.from_user.id, name_activity, date)
+
+        if skipped:
+            await message.answer(f"{name_activity} не будет проводиться {date}")
+            return
+
+        await message.answer(f"❌ В вашем расписании нет повторяющегося занятия {name_activity} на {date}")
+
     async def cmd_schedule_delete(self, message: Message):
         id_user = message.from_user.id
         name_activity = message.text.replace("/delete_activity", "").rstrip().lstrip()
@@ -1,5 +1,15 @@
+import logging
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = {
+    'ежедневно': 'daily',
+    'еженедельно': 'weekly',
+    'daily': 'daily',
+    'weekly': 'weekly',
+}
+
 
 async def parse_time(date: str):
     today = datetime.now().date()
@@ -14,7 +24,7 @@ async def parse_time(date: str):
     return date
 
 async def validate_date(date: str):
-    print(len(date))
+    logger.debug("Проверка даты", extra={'date': date})
     if len(date) != 10 and date not in ["сегодня", "завтра", "послезавтра"]:
         return False
     prep_date = await parse_time(date)
@@ -50,4 +60,24 @@ async def print_free_time(bot, chat_id, free_periods):
         text += f"   День недели: {start.strftime('%A')}\n\n"
 
     await bot.send_message(chat_id,text)
-    return
\ No newline at end of file
+    return
+
+
+async def print_quorum_free_time(bot, chat_id, windows, total_users):
+    if not windows:
+        await bot.send_message(chat_id, "Нет подходящих промежутков в указанный период")
+        return
+
+    text = '''
+    ЛУЧШИЕ ОКНА ДЛЯ ВСТРЕЧИ\n
+    '''
+    for i, (start, end, free_users) in enumerate(windows, 1):
+        duration = end - start
+        duration_hours = duration.total_seconds() / 3600
+
+        text += f"{i}. {start.strftime('%d.%m.%Y %H:%M')} - {end.strftime('%H:%M')}\n"
+        text += f"   Свободны: {free_users} из {total_users}\n"
+        text += f"   Длительность: {duration_hours:.1f} часов\n"
+        text += f"   День недели: {start.strftime('%A')}\n\n"
+
+    await bot.send_message(chat_id, text)
@@ -1,45 +1,55 @@
+import asyncio
+
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
 from .utils_for_user_handlers import *
 
 class UserHandlers:
-    def __init__(self, bot, database):
+    def __init__(self, bot, database, max_concurrency=10, cache_ttl=60):
         self.bot = bot
         self.router = Router()
         self.register_handlers()
         self.database = database
+        self.max_concurrency = max_concurrency
+        self.cache = TTLCache(ttl=cache_ttl)
 
     def register_handlers(self):
         self.router.message.register(self.cmd_add_users, Command("add_users"))
         self.router.message.register(self.cmd_delete_users, Command("delete_users"))
 
+    async def check_users(self, chat_id, user_ids):
+        """Проверяет пользователей параллельно (не больше max_concurrency запросов к Telegram одновременно)"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def check(user_id):
+            if not user_id.lstrip('-').isdigit():
+                return {'found': False, 'message': f'❌ Некорректный id: {user_id}'}
+            async with semaphore:
+                try:
+                    return await check_user_in_chat_by_username(self.bot, chat_id, int(user_id), self.cache)
+                except Exception as e:
+                    return {'found': False, 'message': f'❌ Ошибка при проверке {user_id}: {str(e)}'}
+
+        return await asyncio.gather(*(check(user_id) for user_id in dict.fromkeys(user_ids)))
 
     async def cmd_add_users(self,message: Message):
         try:
-            arr_of_arg = message.text.split(' ')
+            arr_of_arg = message.text.split()
             if len(arr_of_arg) == 1:
                 await message.answer("Недостаточно аргументов, посмотрите пример")
                 return
 
-            user_ids = arr_of_arg[1:]
-
             chat_id = message.chat.id
 
             text = ''''''
 
-            for user_id in user_ids:
-                us_id = int(user_id)
-                result = await check_user_in_chat_by_username(self.bot, chat_id, us_id)
+            for result in await self.check_users(chat_id, arr_of_arg[1:]):
                 if not result['found'] or not result['in_chat']:
                     text += '\n' + result['message']
                     continue
 
-                username = await self.bot.get_chat(us_id)
-                username = username.username
-                print(username)
-
-                success, mes = await self.database.add_user_id_to_db(chat_id, us_id, username)
+                success, mes = await self.database.add_user_id_to_db(chat_id, result['user_id'], result['username'])
                 text += '\n' + mes
             await message.answer(text)
 
@@ -48,27 +58,23 @@ class UserHandlers:
 
     async def cmd_delete_users(self,message: Message):
         try:
-            arr_of_arg = message.text.split(' ')
+            arr_of_arg = message.text.split()
             if len(arr_of_arg) == 1:
                 await message.answer("Недостаточно аргументов, посмотрите пример")
                 return
 
-            user_ids = arr_of_arg[1:]
-
             chat_id = message.chat.id
 
             text = ''''''
 
-            for user_id in user_ids:
-                us_id = int(user_id)
-                result = await check_user_in_chat_by_username(self.bot, chat_id, us_id)
+            for result in await self.check_users(chat_id, arr_of_arg[1:]):
                 if not result['found'] or not result['in_chat']:
                     text += '\n' + result['message']
                     continue
 
-                success, mes = await self.database.delete_user_from_db(chat_id, us_id)
+                success, mes = await self.database.delete_user_from_db(chat_id, result['user_id'], result['username'])
                 text += '\n' + mes
             await message.answer(text)
 
         except Exception as e:
-            await message.answer(f"❌ Ошибка {str(e)}")
\ No newline at end of file
+            await message.answer(f"❌ Ошибка {str(e)}")
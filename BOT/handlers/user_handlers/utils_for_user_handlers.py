@@ -1,46 +1,97 @@
+import logging
+import time
+
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
 
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Небольшой кэш ответов Telegram API с временем жизни записей"""
+
+    def __init__(self, ttl: float = 60, max_size: int = 4096):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.items = {}
+
+    def get(self, key):
+        entry = self.items.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.items[key]
+            return None
+        return value
+
+    def set(self, key, value):
+        if len(self.items) >= self.max_size:
+            now = time.monotonic()
+            self.items = {k: v for k, v in self.items.items() if v[0] > now}
+            if len(self.items) >= self.max_size:
+                self.items.pop(next(iter(self.items)))
+        self.items[key] = (time.monotonic() + self.ttl, value)
+
+
+async def get_chat_cached(bot: Bot, chat_id: int, cache: TTLCache = None):
+    chat = cache.get(('chat', chat_id)) if cache is not None else None
+    if chat is None:
+        chat = await bot.get_chat(chat_id)
+        if cache is not None:
+            cache.set(('chat', chat_id), chat)
+    return chat
+
+
+async def user_in_chat(bot: Bot, chat_id: int, user_id: int, cache: TTLCache = None):
+    status = cache.get(('member', chat_id, user_id)) if cache is not None else None
+    if status is not None:
+        return status in ['member', 'administrator', 'creator', 'restricted']
 
-async def user_in_chat(bot: Bot, chat_id: int, user_id: int):
     try:
         member = await bot.get_chat_member(chat_id, user_id)
+        if cache is not None:
+            cache.set(('member', chat_id, user_id), member.status)
         return member.status in ['member', 'administrator', 'creator', 'restricted']
 
     except TelegramBadRequest as e:
         if "user not found" in str(e).lower() or "chat not found" in str(e).lower():
             return False
-        print(f"Ошибка при проверке пользователя: {e}")
+        logger.warning("Ошибка при проверке пользователя: %s", e, extra={'chat_id': chat_id, 'user_id': user_id})
         return False
 
-async def check_user_in_chat_by_username(bot: Bot, chat_id: int,us_id:int) -> dict:
+async def check_user_in_chat_by_username(bot: Bot, chat_id: int, us_id: int, cache: TTLCache = None) -> dict:
 
     try:
-        user_id = await bot.get_chat(us_id)
+        user = await get_chat_cached(bot, us_id, cache)
     except TelegramBadRequest as e:
         if "user not found" in str(e).lower():
-            print(f"Пользователь не найден")
+            logger.info("Пользователь не найден", extra={'user_id': us_id})
         elif "username not found" in str(e).lower():
-            print(f"Юзернейм {us_id} не существует")
+            logger.info("Юзернейм не существует", extra={'user_id': us_id})
         else:
-            print(f"Ошибка при поиске {us_id}: {e}")
+            logger.warning("Ошибка при поиске пользователя: %s", e, extra={'user_id': us_id})
+        return {'found': False, 'message': f'Пользователь {us_id} не найден в Telegram'}
 
-    username = user_id.username
-    user_id = user_id.id
+    username = user.username
+    user_id = user.id
     if not user_id:
         return {'found' : False, 'message' : f'Пользователь @{username} не найден в Telegram'}
 
-    in_chat = await user_in_chat(bot, chat_id, user_id)
+    in_chat = await user_in_chat(bot, chat_id, user_id, cache)
 
     if in_chat:
         return {'found' : True,
                 'user_id': user_id,
+                'username': username,
                 'chat_id': chat_id,
                 'in_chat': True,
                 'message': ''}
     else:
         return  {'found' : True,
                 'user_id': user_id,
+                'username': username,
                 'chat_id': chat_id,
                 'in_chat': False,
-                'message': f'Пользователь @{username} не в этом чате'}
\ No newline at end of file
+                'message': f'Пользователь @{username} не в этом чате'}
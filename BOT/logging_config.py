@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Стандартные атрибуты LogRecord; всё остальное пришло через extra= и попадает в JSON
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample_rate'}
+
+listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON с полями из extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Человекочитаемый формат для локального запуска: поля extra= дописываются в конец строки"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = {key: value for key, value in vars(record).items() if key not in STANDARD_ATTRIBUTES}
+        if fields:
+            text += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю записей. Доля берётся из extra={'sample_rate': ...}
+    или из rates по уровню записи; по умолчанию пропускается всё.
+    """
+
+    def __init__(self, rates: Optional[Dict[int, float]] = None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, 'sample_rate', self.rates.get(record.levelno, 1.0))
+        return rate >= 1 or random.random() < rate
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не склеивает запись в строку: форматирует уже фоновый поток"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = 'INFO', fmt: str = 'json', debug_sample_rate: float = 1.0, stream=None):
+    """
+    Настраивает логирование процесса: обработчики пишут в очередь, а в поток
+    (по умолчанию stderr) записи выводит фоновый QueueListener, поэтому
+    медленный вывод не блокирует event loop. Повторный вызов перенастраивает.
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = StructuredQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter({logging.DEBUG: debug_sample_rate}))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        if isinstance(old, logging.handlers.QueueHandler):
+            root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    # Отладочные записи библиотек слишком многословны
+    for noisy in ('aiogram', 'aiohttp', 'aiosqlite', 'asyncio', 'urllib3'):
+        logging.getLogger(noisy).setLevel(max(root.level, logging.INFO))
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи"""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,246 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек в секундах
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Metric:
+    def __init__(self, name: str, help_text: str, kind: str):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.values: Dict[Tuple, float] = {}
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        return self.header() + [f'{self.name}{format_labels(labels)} {value}' for labels, value in self.values.items()]
+
+
+class Counter(Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, 'counter')
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, 'gauge')
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, 'histogram')
+        self.buckets = buckets
+        # labels -> [счётчики по корзинам (последняя - +Inf), сумма]
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики одного процесса бота в текстовом формате Prometheus"""
+
+    def __init__(self, prefix: str = 'bot'):
+        self.prefix = prefix
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Tuple[str, Callable[[], Dict]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        metric.name = f'{self.prefix}_{metric.name}'
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self.register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self.register(Gauge(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, buckets))
+
+    def add_collector(self, name: str, collect: Callable[[], Dict]):
+        """
+        collect() возвращает словарь чисел (возможно вложенный), который при
+        каждом запросе /metrics превращается в gauge с префиксом name.
+        """
+        self.collectors.append((name, collect))
+
+    def flatten(self, prefix: str, value, labels: Tuple = ()) -> List[str]:
+        if isinstance(value, (bool, int, float)):
+            return [f'{prefix}{format_labels(labels)} {float(value)}']
+        if not isinstance(value, dict):
+            return []
+
+        lines = []
+        for key, item in value.items():
+            # Словарь словарей (например, лимитеры по хостам): ключи становятся меткой name
+            if isinstance(item, dict) and item and all(isinstance(sub, dict) for sub in item.values()):
+                for name, sub in item.items():
+                    lines += self.flatten(f'{prefix}_{key}', sub, labels + (('name', name),))
+            else:
+                lines += self.flatten(f'{prefix}_{key}', item, labels)
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines += metric.render()
+        for name, collect in self.collectors:
+            try:
+                lines += self.flatten(f'{self.prefix}_{name}', collect())
+            except Exception as e:
+                logger.warning("Ошибка при сборе метрик %s: %s", name, e)
+        return '\n'.join(lines) + '\n'
+
+
+class BotMetrics:
+    """Метрики диспетчера: обновления, обработчики, команды и инференс моделей"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        self.in_flight = self.registry.gauge('updates_in_flight', 'Обновления, которые сейчас обрабатываются')
+        self.updates = self.registry.counter('updates_total', 'Обработанные обновления')
+        self.update_latency = self.registry.histogram('update_latency_seconds', 'Время обработки обновления')
+        self.errors = self.registry.counter('errors_total', 'Исключения в обработчиках')
+        self.handler_latency = self.registry.histogram('handler_latency_seconds', 'Время работы обработчика')
+        self.command_latency = self.registry.histogram('command_latency_seconds', 'Время обработки команды')
+        self.inference_latency = self.registry.histogram('model_inference_seconds', 'Время инференса моделей')
+
+    def update_middleware(self) -> 'UpdateMetricsMiddleware':
+        return UpdateMetricsMiddleware(self)
+
+    def handler_middleware(self) -> 'HandlerMetricsMiddleware':
+        return HandlerMetricsMiddleware(self)
+
+    def inference(self, model: str, seconds: float):
+        """Вызывать из потока event loop: метрики читаются в нём же без блокировок"""
+        self.inference_latency.observe(seconds, model=model)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware на dp.update: число обновлений в работе, их задержка и ошибки"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        update_type = event.event_type
+        self.metrics.in_flight.inc()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.metrics.errors.inc(update_type=update_type, error=type(e).__name__)
+            raise
+        finally:
+            self.metrics.in_flight.dec()
+            self.metrics.updates.inc(update_type=update_type)
+            self.metrics.update_latency.observe(time.perf_counter() - started, update_type=update_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware на router.message: вызывается уже с выбранным обработчиком"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__qualname__', 'unknown')
+        command = data.get('command')
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.handler_latency.observe(elapsed, handler=name)
+            if command is not None:
+                self.metrics.command_latency.observe(elapsed, command=command.command)
+
+
+class MetricsServer:
+    """Локальный HTTP-эндпоинт /metrics для Prometheus"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = '127.0.0.1', port: int = 9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info("📈 Метрики доступны на http://%s:%d/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
@@ -0,0 +1,343 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Hashable, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Чем меньше число, тем раньше уходит запрос
+PRIORITY_MODERATION = 0
+PRIORITY_WARNING = 1
+PRIORITY_NORMAL = 2
+
+MODERATION_METHODS = {'deleteMessage', 'deleteMessages', 'banChatMember', 'restrictChatMember'}
+QUEUED_PREFIXES = ('send', 'delete', 'edit', 'forward', 'copy', 'ban', 'restrict')
+
+outbound_options: ContextVar[Optional[Dict]] = ContextVar('outbound_options', default=None)
+
+
+@contextmanager
+def outbound(priority: Optional[int] = None, coalesce_key: Optional[Hashable] = None):
+    """
+    Параметры для запросов к Telegram внутри блока with.
+
+    Запросы с одинаковым coalesce_key, пока первый из них ждёт в очереди
+    или отправлен меньше coalesce_window секунд назад, повторно не отправляются.
+    """
+    token = outbound_options.set({'priority': priority, 'coalesce_key': coalesce_key})
+    try:
+        yield
+    finally:
+        outbound_options.reset(token)
+
+
+class RateBucket:
+    """Token bucket без ожидания: сообщает, через сколько секунд появится токен"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        self.refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class OutboundJob:
+    def __init__(self, make_request, bot, method, chat_id, priority, coalesce_key):
+        self.make_request = make_request
+        self.bot = bot
+        self.method = method
+        self.chat_id = chat_id
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.future = asyncio.get_running_loop().create_future()
+        self.attempts = 0
+        self.seq = None
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    """
+    Единая очередь исходящих запросов бота (отправка, удаление, редактирование).
+
+    Подключается к сессии бота как middleware, поэтому через неё идут и
+    bot.send_message, и message.answer/message.delete. Запросы уходят по
+    приоритету (удаления модерации раньше предупреждений, предупреждения раньше
+    обычных ответов) с соблюдением общего и поштучного для каждого чата лимита;
+    запросы модерации ограничены только общим лимитом.
+    На TelegramRetryAfter чат ставится на паузу на retry_after секунд, а запрос
+    возвращается в очередь. Служебные запросы (getMe, getUpdates и т.п.) идут мимо.
+
+    У каждого чата своя куча запросов. В общей куче ready лежат только первые
+    запросы чатов, которые могут отправлять, а чаты, упёршиеся в лимит или
+    паузу, ждут в куче sleeping по времени готовности, поэтому выбор запроса
+    не перебирает ограниченные чаты.
+    """
+
+    def __init__(self, global_rate: float = 30, global_burst: float = 30, chat_rate: float = 1,
+                 chat_burst: float = 3, max_concurrency: int = 10, max_retries: int = 3,
+                 coalesce_window: float = 60):
+        self.global_bucket = RateBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets: Dict[int, RateBucket] = {}
+        self.blocked_until: Dict[int, float] = {}
+        self.max_retries = max_retries
+        self.coalesce_window = coalesce_window
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.chats: Dict[int, list] = {}
+        self.ready = []
+        self.sleeping = []
+        self.sleeping_chats = set()
+        self.queued = 0
+        self.counter = itertools.count()
+        self.pending: Dict[Hashable, OutboundJob] = {}
+        self.recent: Dict[Hashable, float] = {}
+        self.wakeup = asyncio.Event()
+        self.worker: Optional[asyncio.Task] = None
+        self.in_flight = set()
+
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.retry_after_hits = 0
+
+    def should_queue(self, method) -> bool:
+        name = method.__api_method__
+        return name.startswith(QUEUED_PREFIXES) and 'Webhook' not in name \
+            and getattr(method, 'chat_id', None) is not None
+
+    async def __call__(self, make_request, bot, method):
+        if not self.should_queue(method):
+            return await make_request(bot, method)
+
+        options = outbound_options.get() or {}
+        coalesce_key = options.get('coalesce_key')
+        if coalesce_key is not None:
+            job = self.pending.get(coalesce_key)
+            if job is not None:
+                self.coalesced += 1
+                return await asyncio.shield(job.future)
+            if time.monotonic() - self.recent.get(coalesce_key, float('-inf')) < self.coalesce_window:
+                self.coalesced += 1
+                return None
+
+        priority = options.get('priority')
+        if priority is None:
+            priority = PRIORITY_MODERATION if method.__api_method__ in MODERATION_METHODS else PRIORITY_NORMAL
+
+        job = OutboundJob(make_request, bot, method, method.chat_id, priority, coalesce_key)
+        if coalesce_key is not None:
+            self.pending[coalesce_key] = job
+        self.push(job)
+        return await job.future
+
+    def push(self, job: OutboundJob):
+        # Повторно поставленный запрос сохраняет своё место среди запросов того же приоритета
+        if job.seq is None:
+            job.seq = next(self.counter)
+        chat = self.chats.setdefault(job.chat_id, [])
+        heapq.heappush(chat, (job.priority, job.seq, job))
+        self.queued += 1
+        # Запрос стал первым в чате: чат снова кандидат, если не ждёт своей очереди
+        if chat[0][2] is job and job.chat_id not in self.sleeping_chats:
+            heapq.heappush(self.ready, (job.priority, job.seq, job.chat_id))
+        self.wakeup.set()
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.run())
+
+    def chat_bucket(self, chat_id: int) -> RateBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 10000:
+                self.prune()
+            bucket = self.chat_buckets[chat_id] = RateBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def prune(self):
+        now = time.monotonic()
+        for chat_id, bucket in list(self.chat_buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self.chat_buckets[chat_id]
+        for chat_id, until in list(self.blocked_until.items()):
+            if until <= now:
+                del self.blocked_until[chat_id]
+        for key, sent_at in list(self.recent.items()):
+            if now - sent_at >= self.coalesce_window:
+                del self.recent[key]
+
+    def job_delay(self, job: OutboundJob, now: float) -> float:
+        blocked = self.blocked_until.get(job.chat_id, 0.0) - now
+        # Лимит на чат касается сообщений: удаления спама в том же чате не ждут его
+        if job.method.__api_method__ in MODERATION_METHODS:
+            return blocked
+        return max(blocked, self.chat_bucket(job.chat_id).delay(now))
+
+    def next_ready(self):
+        """Самый приоритетный запрос, чат которого сейчас не ограничен, и время до ближайшего готового"""
+        now = time.monotonic()
+        while self.sleeping and self.sleeping[0][0] <= now:
+            _, chat_id = heapq.heappop(self.sleeping)
+            self.sleeping_chats.discard(chat_id)
+            self.schedule_chat(chat_id)
+
+        while self.ready:
+            priority, seq, chat_id = heapq.heappop(self.ready)
+            chat = self.chats.get(chat_id)
+            # Устаревшая запись: первым в чате уже стоит другой запрос или чат ждёт
+            if not chat or chat[0][1] != seq or chat_id in self.sleeping_chats:
+                continue
+
+            job = chat[0][2]
+            if job.future.done():
+                self.pop_job(chat_id)
+                self.forget(job)
+                self.schedule_chat(chat_id)
+                continue
+
+            delay = self.job_delay(job, now)
+            if delay > 0:
+                heapq.heappush(self.sleeping, (now + delay, chat_id))
+                self.sleeping_chats.add(chat_id)
+                continue
+
+            self.pop_job(chat_id)
+            self.schedule_chat(chat_id)
+            return job, None
+
+        return None, (self.sleeping[0][0] - now if self.sleeping else None)
+
+    def pop_job(self, chat_id: int) -> OutboundJob:
+        chat = self.chats[chat_id]
+        job = heapq.heappop(chat)[2]
+        self.queued -= 1
+        if not chat:
+            del self.chats[chat_id]
+        return job
+
+    def schedule_chat(self, chat_id: int):
+        """Кладёт первый запрос чата в кучу кандидатов"""
+        chat = self.chats.get(chat_id)
+        if chat:
+            priority, seq, _ = chat[0]
+            heapq.heappush(self.ready, (priority, seq, chat_id))
+
+    async def run(self):
+        while True:
+            ready, wait = self.next_ready()
+            if ready is None:
+                if wait is None and not self.in_flight:
+                    return
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self.global_bucket.delay(time.monotonic())
+            if delay > 0:
+                self.push(ready)
+                await asyncio.sleep(delay)
+                continue
+
+            self.global_bucket.consume()
+            if ready.method.__api_method__ not in MODERATION_METHODS:
+                self.chat_bucket(ready.chat_id).consume()
+            await self.semaphore.acquire()
+            task = asyncio.create_task(self.send(ready))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+    async def send(self, job: OutboundJob):
+        try:
+            job.attempts += 1
+            result = await job.make_request(job.bot, job.method)
+        except TelegramRetryAfter as e:
+            self.retry_after_hits += 1
+            self.blocked_until[job.chat_id] = time.monotonic() + e.retry_after
+            if job.attempts <= self.max_retries and not job.future.done():
+                logger.warning("⏳ Flood control, запрос отложен",
+                               extra={'chat_id': job.chat_id, 'retry_after': e.retry_after})
+                self.push(job)
+                return
+            self.finish(job, error=e)
+        except Exception as e:
+            self.finish(job, error=e)
+        else:
+            self.finish(job, result=result)
+        finally:
+            # Раньше, чем сработает done-callback: иначе run() проснётся, увидит этот
+            # запрос ещё в полёте и уснёт без таймаута
+            self.in_flight.discard(asyncio.current_task())
+            self.semaphore.release()
+            self.wakeup.set()
+
+    def finish(self, job: OutboundJob, result=None, error: Optional[BaseException] = None):
+        self.forget(job)
+        if error is None:
+            self.sent += 1
+            if job.coalesce_key is not None:
+                self.recent[job.coalesce_key] = time.monotonic()
+        else:
+            self.failed += 1
+
+        if job.future.done():
+            return
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    def forget(self, job: OutboundJob):
+        if job.coalesce_key is not None and self.pending.get(job.coalesce_key) is job:
+            del self.pending[job.coalesce_key]
+
+    def metrics(self) -> Dict:
+        return {
+            'queued': self.queued,
+            'in_flight': len(self.in_flight),
+            'sent': self.sent,
+            'failed': self.failed,
+            'coalesced': self.coalesced,
+            'retry_after': self.retry_after_hits,
+            'blocked_chats': sum(until > time.monotonic() for until in self.blocked_until.values()),
+        }
+
+    async def close(self, timeout: float = 10):
+        """Даёт очереди разойтись за timeout секунд, остальные запросы отменяет"""
+        if self.worker is not None and not self.worker.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self.worker), timeout)
+            except asyncio.TimeoutError:
+                self.worker.cancel()
+                await asyncio.gather(self.worker, return_exceptions=True)
+
+        for chat in self.chats.values():
+            for _, _, job in chat:
+                if not job.future.done():
+                    job.future.cancel()
+        self.chats.clear()
+        self.ready.clear()
+        self.sleeping.clear()
+        self.sleeping_chats.clear()
+        self.queued = 0
+        self.pending.clear()
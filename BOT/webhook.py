@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import re
+import secrets
+
+from aiogram import Bot
+from aiogram.types import Update
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram для secret_token в setWebhook
+SECRET_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+
+def check_secret_token(secret_token: str):
+    """Без секрета любой, кто знает адрес вебхука, может подсовывать боту обновления"""
+    if not secret_token:
+        raise ValueError("Для режима webhook задайте WEBHOOK_SECRET")
+    if not SECRET_TOKEN_PATTERN.fullmatch(secret_token):
+        raise ValueError("WEBHOOK_SECRET: от 1 до 256 символов A-Z, a-z, 0-9, _ и -")
+
+
+class WebhookServer:
+    """
+    Принимает обновления Telegram по HTTP.
+
+    Запрос проверяется по секретному токену (без него сервер не создаётся) и
+    сразу получает ответ 200, а обработка идёт в фоне. Одновременно
+    обрабатывается не больше max_in_flight обновлений: когда лимит исчерпан,
+    ответ задерживается, и Telegram сам притормаживает доставку.
+    """
+
+    def __init__(self, bot: Bot, feed_update, path: str = "/webhook", secret_token: str = None,
+                 max_in_flight: int = 100):
+        check_secret_token(secret_token)
+        self.bot = bot
+        self.feed_update = feed_update
+        self.path = path
+        self.secret_token = secret_token
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.tasks = set()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        received = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        # compare_digest принимает строки только из ASCII, поэтому сравниваются байты;
+        # невалидный UTF-8 aiohttp отдаёт суррогатами, их возвращаем в исходные байты
+        if not secrets.compare_digest(received.encode('utf-8', 'surrogateescape'), self.secret_token.encode()):
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self.process(data))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return web.Response()
+
+    async def process(self, data: dict):
+        try:
+            update = Update.model_validate(data, context={"bot": self.bot})
+            await self.feed_update(update)
+        except Exception:
+            logger.exception("Ошибка при обработке обновления", extra={'update_id': data.get('update_id')})
+        finally:
+            self.semaphore.release()
+
+    async def drain(self):
+        """Дожидается обработки уже принятых обновлений"""
+        await asyncio.gather(*self.tasks, return_exceptions=True)
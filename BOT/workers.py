@@ -0,0 +1,391 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from queue import Empty
+
+from aiogram import Bot
+from aiogram.types import Update
+from aiohttp import web
+
+from BOT.config import Config
+from BOT.logging_config import setup_logging
+from BOT.webhook import WebhookServer, check_secret_token
+
+logger = logging.getLogger(__name__)
+
+# Все обработчики бота подписаны только на сообщения
+ALLOWED_UPDATES = ["message"]
+
+SHARED_MODELS_MODULE = 'BOT.handlers.moderation_handlers.shared_models'
+# Каталог, в котором лежит пакет BOT
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def update_chat_id(update: Update) -> int:
+    event = update.event
+    chat = getattr(event, "chat", None) or getattr(getattr(event, "message", None), "chat", None)
+    if chat is not None:
+        return chat.id
+
+    user = getattr(event, "from_user", None)
+    return user.id if user is not None else 0
+
+
+def process_memory(pid: int) -> dict:
+    """
+    Память процесса в КБ: rss - всё, что в RAM, pss - RSS, где общие с другими
+    процессами страницы поделены между ними, shared - общие страницы
+    """
+    memory = {}
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    memory['rss_kb'] = int(line.split()[1])
+        with open(f'/proc/{pid}/smaps_rollup') as file:
+            fields = {line.split(':')[0]: int(line.split()[1]) for line in file if line.rstrip().endswith('kB')}
+        memory['pss_kb'] = fields.get('Pss', 0)
+        memory['shared_kb'] = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+        memory['private_kb'] = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    except (OSError, ValueError):
+        pass
+    return memory
+
+
+def run_worker(index: int, token: str, queue, heartbeat, heartbeat_interval: float, workers: int = 1,
+               preload_models: bool = False):
+    # Процесс запущен через spawn или forkserver, логирование родителя ему не досталось
+    setup_logging(Config.LOG_LEVEL, Config.LOG_FORMAT, Config.LOG_DEBUG_SAMPLE_RATE)
+    asyncio.run(worker_main(index, token, queue, heartbeat, heartbeat_interval, workers, preload_models))
+
+
+async def worker_main(index: int, token: str, queue, heartbeat, heartbeat_interval: float, workers: int = 1,
+                      preload_models: bool = False):
+    """
+    Процесс-воркер: свой TelegramBot со всеми роутерами и моделями.
+
+    Обновления одного чата обрабатываются строго по очереди, разные чаты -
+    параллельно.
+    """
+    from BOT.core import TelegramBot
+
+    # Общие лимиты Telegram, Nominatim и Overpass делятся между воркерами, лимит на
+    # чат - нет: каждый чат обслуживает только один воркер
+    class WorkerConfig(Config):
+        OUTBOUND_GLOBAL_RATE = Config.OUTBOUND_GLOBAL_RATE / workers
+        NOMINATIM_RATE = Config.NOMINATIM_RATE / workers
+        OVERPASS_RATE = Config.OVERPASS_RATE / workers
+        # Меньше одного токена ограничитель не выдаст ни одного запроса
+        OVERPASS_BURST = max(1.0, Config.OVERPASS_BURST / workers)
+        # У каждого воркера свой /metrics на следующем порту
+        METRICS_PORT = Config.METRICS_PORT + 1 + index if Config.METRICS_PORT else 0
+
+    models = None
+    if preload_models:
+        if SHARED_MODELS_MODULE not in sys.modules:
+            # forkserver молча пропускает ImportError при предзагрузке; повторный импорт
+            # ниже либо загрузит модели в самом воркере, либо упадёт с настоящей причиной
+            logger.error("Модели не были загружены в forkserver, воркер загружает их сам",
+                         extra={'worker': index})
+        # Обычно уже импортирован в forkserver, и модели не загружаются заново
+        from BOT.handlers.moderation_handlers.shared_models import MODELS as models
+
+    # Базы создаёт и перестраивает фронт-процесс до запуска воркеров
+    telegram_bot = TelegramBot(token, config=WorkerConfig, models=models, init_db=False)
+    await telegram_bot.on_startup()
+
+    loop = asyncio.get_running_loop()
+    lanes = {}
+    consumers = set()
+
+    async def beat():
+        while True:
+            heartbeat.value = time.time()
+            await asyncio.sleep(heartbeat_interval)
+
+    async def consume(chat_id, lane):
+        while True:
+            payload = await lane.get()
+            try:
+                update = Update.model_validate_json(payload, context={"bot": telegram_bot.bot})
+                await telegram_bot.dp.feed_update(telegram_bot.bot, update)
+            except Exception:
+                logger.exception("❌ Ошибка при обработке обновления", extra={'worker': index, 'chat_id': chat_id})
+
+            if lane.empty():
+                del lanes[chat_id]
+                return
+
+    beat_task = asyncio.create_task(beat())
+    try:
+        while True:
+            item = await loop.run_in_executor(None, queue.get)
+            if item is None:
+                break
+
+            chat_id, payload = item
+            if chat_id not in lanes:
+                lane = asyncio.Queue()
+                lanes[chat_id] = lane
+                task = asyncio.create_task(consume(chat_id, lane))
+                consumers.add(task)
+                task.add_done_callback(consumers.discard)
+            lanes[chat_id].put_nowait(payload)
+
+        await asyncio.gather(*consumers)
+    finally:
+        beat_task.cancel()
+        await telegram_bot.on_shutdown()
+        await telegram_bot.bot.session.close()
+
+
+class ShardedBotPool:
+    """
+    Фронт-процесс принимает обновления (polling или webhook) и по chat_id
+    раскладывает их по N процессам-воркерам, поэтому порядок внутри чата
+    сохраняется, а разные чаты обрабатываются на разных ядрах.
+    """
+
+    # Функция процесса-воркера с сигнатурой run_worker
+    worker_target = staticmethod(run_worker)
+
+    def __init__(self, token: str, workers: int, config=Config, heartbeat_interval: float = 5,
+                 heartbeat_timeout: float = 60, startup_timeout: float = 600, preload_models: bool = False):
+        self.token = token
+        self.config = config
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_timeout = startup_timeout
+        self.preload_models = preload_models
+
+        if preload_models:
+            # Процесс forkserver однопоточный и без event loop: он один раз загружает
+            # модели, а воркеры (в том числе перезапущенные) получаются его fork'ом
+            self.context = multiprocessing.get_context("forkserver")
+            self.context.set_forkserver_preload([SHARED_MODELS_MODULE])
+            # forkserver запускается через python -c и не получает sys.path родителя,
+            # поэтому без этого BOT импортируется только из текущего каталога
+            paths = os.environ.get('PYTHONPATH', '').split(os.pathsep)
+            if PROJECT_ROOT not in paths:
+                os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [PROJECT_ROOT, *paths]))
+        else:
+            self.context = multiprocessing.get_context("spawn")
+        self.memory_reported = False
+        self.queues = [self.context.Queue() for _ in range(workers)]
+        self.heartbeats = [self.context.Value('d', 0.0) for _ in range(workers)]
+        self.processes = [None] * workers
+        self.started_at = [0.0] * workers
+        self.restarts = [0] * workers
+
+        self.bot = Bot(token)
+
+    def start_worker(self, index: int):
+        self.heartbeats[index].value = 0.0
+        process = self.context.Process(
+            target=self.worker_target,
+            args=(index, self.token, self.queues[index], self.heartbeats[index], self.heartbeat_interval,
+                  self.workers, self.preload_models),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.time()
+
+    def stop_workers(self, timeout: float = 30):
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+
+    def health(self):
+        now = time.time()
+        return [
+            {
+                'worker': index,
+                'pid': process.pid if process else None,
+                'alive': bool(process and process.is_alive()),
+                'heartbeat_age': now - self.heartbeats[index].value if self.heartbeats[index].value else None,
+                'restarts': self.restarts[index],
+                **(process_memory(process.pid) if process and process.is_alive() else {}),
+            }
+            for index, process in enumerate(self.processes)
+        ]
+
+    def is_healthy(self, index: int) -> bool:
+        process = self.processes[index]
+        if process is None or not process.is_alive():
+            return False
+
+        last_beat = self.heartbeats[index].value
+        now = time.time()
+        if not last_beat:
+            return now - self.started_at[index] < self.startup_timeout
+        return now - last_beat < self.heartbeat_timeout
+
+    async def supervise(self):
+        """
+        Перезапускает упавшие или зависшие воркеры.
+
+        Убитый во время queue.get воркер оставляет замок чтения очереди
+        захваченным навсегда, поэтому перезапущенный воркер получает новую
+        очередь, а из старой переносится всё, что удаётся забрать.
+        """
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            for index in range(self.workers):
+                if self.is_healthy(index):
+                    continue
+
+                logger.warning("⚠️ Воркер не отвечает, перезапуск", extra={'worker': index})
+                process = self.processes[index]
+                if process is not None and process.is_alive():
+                    process.terminate()
+                    await asyncio.get_running_loop().run_in_executor(None, process.join, 10)
+                self.restarts[index] += 1
+                self.replace_queue(index)
+                self.start_worker(index)
+
+            if not self.memory_reported and all(heartbeat.value for heartbeat in self.heartbeats):
+                self.report_memory()
+
+    def replace_queue(self, index: int):
+        """Новая очередь для воркера index; необработанные обновления старой переносятся в неё"""
+        old = self.queues[index]
+        new = self.queues[index] = self.context.Queue()
+
+        moved = 0
+        while True:
+            try:
+                # Если замок чтения остался у убитого воркера, get_nowait сразу бросает Empty
+                item = old.get_nowait()
+            except (Empty, OSError, EOFError):
+                break
+            new.put(item)
+            moved += 1
+
+        try:
+            lost = old.qsize()
+        except NotImplementedError:
+            lost = None
+        if moved or lost:
+            logger.warning("Очередь воркера заменена", extra={'worker': index, 'moved': moved, 'lost': lost})
+
+        old.cancel_join_thread()
+        old.close()
+
+    def report_memory(self):
+        """Пишет в лог память воркеров, когда все они загрузили модели"""
+        self.memory_reported = True
+        workers = self.health()
+        logger.info("Память воркеров", extra={
+            'preload_models': self.preload_models,
+            'workers': [{key: worker.get(key) for key in ('worker', 'pid', 'rss_kb', 'pss_kb', 'shared_kb')}
+                        for worker in workers],
+            'total_rss_kb': sum(worker.get('rss_kb', 0) for worker in workers),
+            'total_pss_kb': sum(worker.get('pss_kb', 0) for worker in workers),
+        })
+
+    async def dispatch(self, update: Update):
+        chat_id = update_chat_id(update)
+        payload = update.model_dump_json(exclude_unset=True, by_alias=True)
+        self.queues[chat_id % self.workers].put((chat_id, payload))
+
+    async def poll(self):
+        await self.bot.delete_webhook(drop_pending_updates=True)
+
+        offset = None
+        while True:
+            try:
+                updates = await self.bot.get_updates(offset=offset, timeout=30, allowed_updates=ALLOWED_UPDATES)
+            except Exception as e:
+                logger.warning("❌ Ошибка при получении обновлений: %s", e)
+                await asyncio.sleep(5)
+                continue
+
+            for update in updates:
+                await self.dispatch(update)
+                offset = update.update_id + 1
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        health = self.health()
+        return web.json_response(health, status=200 if all(worker['alive'] for worker in health) else 503)
+
+    async def serve_health(self) -> web.AppRunner:
+        """/health фронт-процесса в режиме polling: на METRICS_PORT, который воркеры не занимают"""
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, self.config.METRICS_HOST, self.config.METRICS_PORT).start()
+        logger.info("🩺 Состояние воркеров доступно на http://%s:%d/health",
+                    self.config.METRICS_HOST, self.config.METRICS_PORT)
+        return runner
+
+    async def prepare_databases(self):
+        """
+        Схемы баз и индекс занятости готовятся один раз здесь: воркеры открывают
+        те же файлы и при одновременной инициализации мешали бы друг другу
+        """
+        from BOT.core import create_databases, init_databases
+
+        await init_databases(create_databases())
+
+    async def serve_webhook(self):
+        server = WebhookServer(
+            bot=self.bot,
+            feed_update=self.dispatch,
+            path=self.config.WEBHOOK_PATH,
+            secret_token=self.config.WEBHOOK_SECRET,
+            max_in_flight=self.config.WEBHOOK_MAX_IN_FLIGHT,
+        )
+        app = server.create_app()
+        app.router.add_get("/health", self.handle_health)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.config.WEBHOOK_HOST, self.config.WEBHOOK_PORT).start()
+            await self.bot.set_webhook(
+                url=self.config.WEBHOOK_URL,
+                secret_token=self.config.WEBHOOK_SECRET,
+                allowed_updates=ALLOWED_UPDATES,
+                max_connections=min(self.config.WEBHOOK_MAX_IN_FLIGHT, 100),
+                drop_pending_updates=True,
+            )
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await server.drain()
+
+    async def run(self):
+        if self.config.DELIVERY_MODE == "webhook":
+            check_secret_token(self.config.WEBHOOK_SECRET)
+
+        await self.prepare_databases()
+        for index in range(self.workers):
+            self.start_worker(index)
+        logger.info("🚀 Запущено воркеров: %d", self.workers)
+
+        supervisor = asyncio.create_task(self.supervise())
+        health_runner = None
+        try:
+            if self.config.DELIVERY_MODE == "webhook":
+                await self.serve_webhook()
+            else:
+                if self.config.METRICS_PORT:
+                    health_runner = await self.serve_health()
+                await self.poll()
+        finally:
+            supervisor.cancel()
+            if health_runner is not None:
+                await health_runner.cleanup()
+            self.stop_workers()
+            await self.bot.session.close()
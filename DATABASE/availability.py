@@ -0,0 +1,47 @@
+"""
+Битовые маски занятости: один бит на минуту суток, 1440 бит (180 байт) на
+пользователя и день. Бит выставлен, если в эту минуту пользователь занят.
+"""
+
+MINUTES_IN_DAY = 24 * 60
+BITSET_SIZE = MINUTES_IN_DAY // 8
+
+
+def to_minutes(time: str) -> int:
+    hours, minutes = time.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def mark_busy(bits: int, start_time: str, end_time: str) -> int:
+    """Отмечает занятым полуинтервал [start_time, end_time)"""
+    start, end = to_minutes(start_time), to_minutes(end_time)
+    if end <= start:
+        return bits
+    return bits | (((1 << (end - start)) - 1) << start)
+
+
+def to_blob(bits: int) -> bytes:
+    return bits.to_bytes(BITSET_SIZE, 'little')
+
+
+def from_blob(blob: bytes) -> int:
+    return int.from_bytes(blob, 'little')
+
+
+def free_runs(bits: int, start_minute: int, end_minute: int):
+    """Возвращает свободные отрезки [начало, конец) в минутах внутри [start_minute, end_minute)"""
+    free = ~(bits >> start_minute) & ((1 << (end_minute - start_minute)) - 1)
+
+    runs = []
+    offset = start_minute
+    while free:
+        skip = (free & -free).bit_length() - 1
+        free >>= skip
+        offset += skip
+
+        length = (free ^ (free + 1)).bit_length() - 1
+        runs.append((offset, offset + length))
+        free >>= length
+        offset += length
+
+    return runs
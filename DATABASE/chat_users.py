@@ -1,5 +1,9 @@
+import logging
+
 import aiosqlite
 
+logger = logging.getLogger(__name__)
+
 class ChatUsersDB:
     def __init__(self, path):
         self.path = path
@@ -13,7 +17,7 @@ class ChatUsersDB:
             chat_id INTEGER NOT NULL,
             user_id INTEGER NOT NULL)''')
             await db.commit()
-        print("✅ База данных с пользователями чатов инициализирована")
+        logger.info("✅ База данных с пользователями чатов инициализирована")
 
     async def check_user_exist_in_chat_in_db(self, chat_id:int , user_id: int):
         async with aiosqlite.connect(self.path) as db:
@@ -27,7 +31,8 @@ class ChatUsersDB:
 
                 return result is not None
             except Exception as e:
-                print(f"❌ Ошибка при проверке {str(e)}")
+                logger.warning("❌ Ошибка при проверке пользователя: %s", e,
+                               extra={'chat_id': chat_id, 'user_id': user_id})
                 return False
 
 
@@ -48,6 +53,22 @@ class ChatUsersDB:
                 return False, f"❌ Ошибка при добавлении {str(e)}"
 
 
+    async def delete_user_from_db(self, chat_id:int, user_id:int, user_name:str):
+        async with aiosqlite.connect(self.path) as db:
+            try:
+                cursor = await db.execute('''
+                DELETE FROM chats_users
+                WHERE chat_id = ? AND user_id = ?''', (chat_id, user_id))
+                await db.commit()
+
+                if cursor.rowcount:
+                    return True, f'✅ Пользователь @{user_name} удалён'
+                return False, f'❌ Пользователь @{user_name} не был добавлен'
+
+            except Exception as e:
+                return False, f"❌ Ошибка при удалении {str(e)}"
+
+
     async def get_users_of_chat(self, chat_id:int):
         async with aiosqlite.connect(self.path) as db:
             try:
@@ -0,0 +1,88 @@
+import logging
+import re
+import time
+from collections import OrderedDict
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_address(address: str) -> str:
+    """Приводит адрес к ключу кэша: регистр, ё/е, пунктуация и лишние пробелы не важны"""
+    address = address.casefold().replace('ё', 'е')
+    return ' '.join(re.sub(r'[^\w]+', ' ', address).split())
+
+
+class GeocodeCacheDB:
+    def __init__(self, path, ttl: int = 30 * 24 * 3600, negative_ttl: int = 24 * 3600, memory_size: int = 1024):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+
+    async def init_db(self):
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute('''
+            CREATE TABLE IF NOT EXISTS geocodes (
+            address TEXT PRIMARY KEY,
+            latitude REAL,
+            longitude REAL,
+            expires_at REAL NOT NULL)''')
+            await db.execute('''
+            DELETE FROM geocodes
+            WHERE expires_at <= ?''', (time.time(),))
+            await db.commit()
+        logger.info("✅ База данных геокодирования инициализирована")
+
+    def remember(self, key, coords, expires_at):
+        self.memory[key] = (coords, expires_at)
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    async def get_coordinates(self, address: str):
+        """
+        Ищет адрес сначала в памяти (LRU), затем в SQLite.
+
+        Returns:
+            (найдено в кэше, координаты или None для заведомо ненайденного адреса)
+        """
+        key = normalize_address(address)
+        now = time.time()
+
+        entry = self.memory.get(key)
+        if entry is not None:
+            coords, expires_at = entry
+            if expires_at > now:
+                self.memory.move_to_end(key)
+                return True, coords
+            del self.memory[key]
+
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute('''
+            SELECT latitude, longitude, expires_at FROM geocodes
+            WHERE address = ? AND expires_at > ?''', (key, now))
+            row = await cursor.fetchone()
+
+        if row is None:
+            return False, None
+
+        latitude, longitude, expires_at = row
+        coords = (latitude, longitude) if latitude is not None else None
+        self.remember(key, coords, expires_at)
+        return True, coords
+
+    async def save_coordinates(self, address: str, coords):
+        """Сохраняет координаты; coords=None запоминает, что адрес не найден (на меньший срок)"""
+        key = normalize_address(address)
+        expires_at = time.time() + (self.ttl if coords else self.negative_ttl)
+        self.remember(key, coords, expires_at)
+
+        latitude, longitude = coords if coords else (None, None)
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute('''
+            INSERT OR REPLACE INTO geocodes (address, latitude, longitude, expires_at)
+            VALUES (?, ?, ?, ?)''', (key, latitude, longitude, expires_at))
+            await db.commit()
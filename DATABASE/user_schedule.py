@@ -1,11 +1,39 @@
 from sqlite3 import DatabaseError
+import heapq
+import logging
 import aiosqlite
 from datetime import datetime, timedelta
 import pandas as pd
 
+from DATABASE.availability import mark_busy, to_blob, from_blob, free_runs
+
+logger = logging.getLogger(__name__)
+
+RECURRENCE_STEPS = {'daily': 1, 'weekly': 7}
+
+
+def occurrence_dates(frequency: str, rule_start: str, rule_end: str, window_start: str, window_end: str):
+    """Даты повторений правила внутри окна [window_start, window_end]"""
+    step = RECURRENCE_STEPS[frequency]
+    first_day = datetime.strptime(rule_start, "%Y-%m-%d")
+    last_day = min(datetime.strptime(rule_end, "%Y-%m-%d"), datetime.strptime(window_end, "%Y-%m-%d"))
+
+    day = max(first_day, datetime.strptime(window_start, "%Y-%m-%d"))
+    shift = (day - first_day).days % step
+    if shift:
+        day += timedelta(days=step - shift)
+
+    dates = []
+    while day <= last_day:
+        dates.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=step)
+    return dates
+
+
 class ScheduleUserDB:
-    def __init__(self,path):
+    def __init__(self,path, engine = 'bitset'):
         self.path = path
+        self.engine = engine
 
     async def init_db(self):
         async with aiosqlite.connect(self.path) as db:
@@ -18,8 +46,39 @@ class ScheduleUserDB:
             end_time TIME NOT NULL,
             activity_name TEXT NOT NULL
             )''')
+            await db.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_schedules (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            frequency TEXT NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            activity_name TEXT NOT NULL
+            )''')
+            await db.execute('''
+            CREATE INDEX IF NOT EXISTS recurring_schedules_user_period
+            ON recurring_schedules (user_id, start_date, end_date)''')
+            await db.execute('''
+            CREATE TABLE IF NOT EXISTS recurring_exceptions (
+            rule_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            PRIMARY KEY (rule_id, date)
+            )''')
+            await db.execute('''
+            CREATE TABLE IF NOT EXISTS availability (
+            user_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            busy BLOB NOT NULL,
+            PRIMARY KEY (user_id, date)
+            )''')
             await db.commit()
-        print("✅ База данных с временными интервалами инициализирована")
+
+        # Индекс - производные данные: после сбоя между записью занятия и маски он мог
+        # разойтись с schedules, поэтому при запуске всегда строится заново
+        await self.rebuild_availability_index()
+        logger.info("✅ База данных с временными интервалами инициализирована")
 
     async def check_time_conflict(self,user_id: int, date: str, start_time: str, end_time: str):
         async with aiosqlite.connect(self.path) as db:
@@ -33,7 +92,13 @@ class ScheduleUserDB:
 
             cursor = await db.execute(quary, params)
             conflict = await cursor.fetchall()
-            return conflict
+
+        for occurrence in await self.get_recurring_occurrences([user_id], date, date):
+            _, occurrence_date, occurrence_start, occurrence_end, name = occurrence
+            if start_time < occurrence_end and end_time > occurrence_start:
+                conflict.append((occurrence_date, occurrence_start, occurrence_end, name))
+
+        return conflict
 
     async def add_activity(self,user_id: int, date: str, start_time: str, end_time: str,
                            activity_name: str):
@@ -51,11 +116,218 @@ class ScheduleUserDB:
                 await db.execute('''
                 INSERT INTO schedules (user_id, date, start_time, end_time, activity_name)
                 VALUES (?, ?, ?, ?, ?)''', (user_id, date, start_time, end_time, activity_name))
+
+                cursor = await db.execute('''
+                SELECT busy FROM availability
+                WHERE user_id = ? AND date = ?''', (user_id, date))
+                row = await cursor.fetchone()
+
+                busy = mark_busy(from_blob(row[0]) if row else 0, start_time, end_time)
+                await db.execute('''
+                INSERT OR REPLACE INTO availability (user_id, date, busy)
+                VALUES (?, ?, ?)''', (user_id, date, to_blob(busy)))
+
                 await db.commit()
                 return True, "✅ Занятие успешно добавлено!"
             except Exception as e:
                 return False, f"❌ Ошибка при добавлении {str(e)}"
 
+    async def add_recurring_activity(self, user_id: int, frequency: str, start_date: str, end_date: str,
+                                     start_time: str, end_time: str, activity_name: str):
+        if frequency not in RECURRENCE_STEPS:
+            return False, "❌ Периодичность должна быть daily или weekly"
+
+        if datetime.strptime(start_time, "%H:%M") > datetime.strptime(end_time, "%H:%M"):
+            return False, "❌ Время окончания должно быть позже времени начала"
+
+        if start_date > end_date:
+            return False, "❌ Дата окончания повторений должна быть позже даты начала"
+
+        conflicts = await self.check_recurring_conflict(user_id, frequency, start_date, end_date, start_time,
+                                                        end_time)
+
+        if conflicts:
+            conflict_info = "\n".join([f"• {c[3]} - {c[0]} {c[1]}:{c[2]}" for c in conflicts[:10]])
+            if len(conflicts) > 10:
+                conflict_info += f"\n... и ещё {len(conflicts) - 10}"
+            return False, f"❌ Повторения пересекаются с существующими занятиями:\n{conflict_info}"
+
+        async with aiosqlite.connect(self.path) as db:
+            try:
+                await db.execute('''
+                INSERT INTO recurring_schedules (user_id, frequency, start_date, end_date, start_time, end_time,
+                activity_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?)''', (user_id, frequency, start_date, end_date, start_time, end_time,
+                                             activity_name))
+                await db.commit()
+                return True, "✅ Повторяющееся занятие успешно добавлено!"
+            except Exception as e:
+                return False, f"❌ Ошибка при добавлении {str(e)}"
+
+    async def check_recurring_conflict(self, user_id: int, frequency: str, start_date: str, end_date: str,
+                                       start_time: str, end_time: str):
+        """Занятия, с которыми пересекается хотя бы одно повторение нового правила"""
+        dates = set(occurrence_dates(frequency, start_date, end_date, start_date, end_date))
+
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute('''
+            SELECT date, start_time, end_time, activity_name from schedules
+            WHERE user_id = ? AND date >= ? AND date <= ?
+            and (
+                ? < end_time AND ? > start_time)
+            ORDER BY date, start_time''', (user_id, start_date, end_date, start_time, end_time))
+            conflict = [row for row in await cursor.fetchall() if row[0] in dates]
+
+        for occurrence in await self.get_recurring_occurrences([user_id], start_date, end_date):
+            _, occurrence_date, occurrence_start, occurrence_end, name = occurrence
+            if occurrence_date in dates and start_time < occurrence_end and end_time > occurrence_start:
+                conflict.append((occurrence_date, occurrence_start, occurrence_end, name))
+
+        return conflict
+
+    async def add_recurring_exception(self, user_id: int, activity_name: str, date: str):
+        """
+        Отменяет одно повторение занятия. Дата должна быть днём, в который
+        занятие действительно проводится.
+
+        Returns:
+            Число правил, для которых дата отменена
+        """
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute('''
+            SELECT ID, frequency, start_date, end_date FROM recurring_schedules
+            WHERE user_id = ? AND activity_name = ? AND start_date <= ? AND end_date >= ?''',
+                                      (user_id, activity_name, date, date))
+            rules = [rule_id for rule_id, frequency, rule_start, rule_end in await cursor.fetchall()
+                     if occurrence_dates(frequency, rule_start, rule_end, date, date)]
+
+            if not rules:
+                return 0
+
+            await db.executemany('''
+            INSERT OR IGNORE INTO recurring_exceptions (rule_id, date)
+            VALUES (?, ?)''', [(rule_id, date) for rule_id in rules])
+
+            await db.commit()
+            return len(rules)
+
+    async def get_recurring_occurrences(self, user_ids, start_date: str, end_date: str):
+        """
+        Разворачивает повторяющиеся занятия только внутри окна [start_date, end_date],
+        поэтому стоимость не зависит от общего числа повторений правила.
+
+        Returns:
+            Список (user_id, дата, начало, конец, название)
+        """
+        if not user_ids:
+            return []
+
+        placeholders = ','.join(['?' for _ in user_ids])
+
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute("""
+            SELECT ID, user_id, frequency, start_date, end_date, start_time, end_time, activity_name
+            FROM recurring_schedules
+            WHERE user_id IN ({})
+                AND start_date <= ?
+                AND end_date >= ?
+            """.format(placeholders), [*user_ids, end_date, start_date])
+            rules = await cursor.fetchall()
+
+            if not rules:
+                return []
+
+            rule_placeholders = ','.join(['?' for _ in rules])
+            cursor = await db.execute("""
+            SELECT rule_id, date FROM recurring_exceptions
+            WHERE rule_id IN ({})
+                AND date >= ?
+                AND date <= ?
+            """.format(rule_placeholders), [*(rule[0] for rule in rules), start_date, end_date])
+            exceptions = set(await cursor.fetchall())
+
+        occurrences = []
+        for rule_id, user_id, frequency, rule_start, rule_end, start_time, end_time, name in rules:
+            for occurrence_date in occurrence_dates(frequency, rule_start, rule_end, start_date, end_date):
+                if (rule_id, occurrence_date) not in exceptions:
+                    occurrences.append((user_id, occurrence_date, start_time, end_time, name))
+
+        return occurrences
+
+    async def rebuild_availability_day(self, db, user_id: int, date: str):
+        cursor = await db.execute('''
+        SELECT start_time, end_time FROM schedules
+        WHERE user_id = ? AND date = ?''', (user_id, date))
+
+        busy = 0
+        for start_time, end_time in await cursor.fetchall():
+            busy = mark_busy(busy, start_time, end_time)
+
+        if busy:
+            await db.execute('''
+            INSERT OR REPLACE INTO availability (user_id, date, busy)
+            VALUES (?, ?, ?)''', (user_id, date, to_blob(busy)))
+        else:
+            await db.execute('''
+            DELETE FROM availability
+            WHERE user_id = ? AND date = ?''', (user_id, date))
+
+    async def rebuild_availability_index(self):
+        """Пересчитывает маски занятости по всей таблице schedules"""
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute('''
+            SELECT user_id, date, start_time, end_time FROM schedules''')
+
+            masks = {}
+            for user_id, date, start_time, end_time in await cursor.fetchall():
+                masks[(user_id, date)] = mark_busy(masks.get((user_id, date), 0), start_time, end_time)
+
+            await db.execute('DELETE FROM availability')
+            await db.executemany('''
+            INSERT INTO availability (user_id, date, busy)
+            VALUES (?, ?, ?)''', [(user_id, date, to_blob(busy)) for (user_id, date), busy in masks.items() if busy])
+            await db.commit()
+
+    async def get_availability_from_db(self, user_ids, days_range: int = 7):
+        """
+        Объединяет (побитовое ИЛИ) маски занятости всех пользователей по дням,
+        включая развёрнутые в окне повторяющиеся занятия.
+
+        Returns:
+            Словарь дата -> маска занятости
+        """
+        if not user_ids:
+            return {}
+
+        period_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_date = period_start.strftime('%Y-%m-%d')
+        end_date = (period_start + timedelta(days=days_range)).strftime('%Y-%m-%d')
+
+        placeholders = ','.join(['?' for _ in user_ids])
+
+        try:
+            async with aiosqlite.connect(self.path) as db:
+                cursor = await db.execute("""
+                SELECT date, busy FROM availability
+                WHERE user_id IN ({})
+                    AND date >= ?
+                    AND date <= ?
+                """.format(placeholders), [*user_ids, start_date, end_date])
+                rows = await cursor.fetchall()
+
+            masks = {}
+            for date, busy in rows:
+                masks[date] = masks.get(date, 0) | from_blob(busy)
+
+            occurrences = await self.get_recurring_occurrences(user_ids, start_date, end_date)
+            for _, date, start_time, end_time, _ in occurrences:
+                masks[date] = mark_busy(masks.get(date, 0), start_time, end_time)
+
+            return masks
+
+        except Exception as e:
+            raise DatabaseError(f"Ошибка при получении занятости пользователей: {str(e)}") from e
+
     async def get_activity_by_date(self, user_id: int, date: str):
         async with aiosqlite.connect(self.path) as db:
             cursor = await db.execute('''
@@ -97,15 +369,19 @@ class ScheduleUserDB:
                 cursor = await db.execute(query, params)
                 rows = await cursor.fetchall()
 
-                if not rows:
-                    return pd.DataFrame(columns=['user_id', 'start_time', 'end_time'])
+            occurrences = await self.get_recurring_occurrences(user_ids, start_date, end_date)
+            for user_id, date, start_time, end_time, _ in occurrences:
+                rows.append((user_id, f"{date} {start_time}", f"{date} {end_time}"))
 
-                df = pd.DataFrame(rows, columns=['user_id', 'start_time', 'end_time'])
+            if not rows:
+                return pd.DataFrame(columns=['user_id', 'start_time', 'end_time'])
 
-                df['start_time'] = pd.to_datetime(df['start_time'])
-                df['end_time'] = pd.to_datetime(df['end_time'])
+            df = pd.DataFrame(rows, columns=['user_id', 'start_time', 'end_time'])
 
-                return df
+            df['start_time'] = pd.to_datetime(df['start_time'], format='ISO8601')
+            df['end_time'] = pd.to_datetime(df['end_time'], format='ISO8601')
+
+            return df
 
         except Exception as e:
             raise DatabaseError(f"Ошибка при получении временных ячеек пользователей: {str(e)}") from e
@@ -166,6 +442,25 @@ class ScheduleUserDB:
 
 
     async def find_common_free_time(self, user_ids,days_range,workday_start = 9,workday_end = 20):
+        if self.engine == 'bitset':
+            return await self.find_common_free_time_bitset(user_ids, days_range, workday_start, workday_end)
+
+        return await self.find_common_free_time_dataframe(user_ids, days_range, workday_start, workday_end)
+
+    async def find_common_free_time_bitset(self, user_ids, days_range, workday_start = 9, workday_end = 20):
+        masks = await self.get_availability_from_db(user_ids, days_range)
+
+        all_free_periods = []
+        for day_offset in range(days_range):
+            current_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=day_offset)
+            busy = masks.get(current_day.strftime('%Y-%m-%d'), 0)
+
+            for start, end in free_runs(busy, workday_start * 60, workday_end * 60):
+                all_free_periods.append((current_day + timedelta(minutes=start), current_day + timedelta(minutes=end)))
+
+        return all_free_periods
+
+    async def find_common_free_time_dataframe(self, user_ids,days_range,workday_start = 9,workday_end = 20):
 
         activities_df = await self.get_activities_from_db(user_ids, days_range)
 
@@ -202,12 +497,145 @@ class ScheduleUserDB:
 
         return all_free_periods
 
+    async def find_quorum_free_time(self, user_ids, days_range, min_users=None, min_duration=0, top=5,
+                                    workday_start=9, workday_end=20):
+        """
+        Ищет окна, в которые свободны хотя бы min_users из отслеживаемых пользователей.
+
+        Занятия превращаются в события начала/конца, которые сортируются один раз и
+        проходятся заметающей прямой со счётчиком занятых пользователей, поэтому
+        сложность O(n log n) по числу занятий.
+
+        Args:
+            min_users: Минимальное число свободных пользователей (по умолчанию все)
+            min_duration: Минимальная длительность окна в минутах
+            top: Сколько лучших окон вернуть (None - все)
+
+        Returns:
+            Список (начало, конец, число свободных), отсортированный по числу
+            свободных пользователей и длительности окна
+        """
+        total_users = len(user_ids)
+        if min_users is None:
+            min_users = total_users
+        min_users = max(min_users, 1)
+
+        if total_users < min_users:
+            return []
+
+        activities_df = await self.get_activities_from_db(user_ids, days_range)
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        events = []
+        for user_id, start, end in zip(activities_df['user_id'], activities_df['start_time'],
+                                       activities_df['end_time']):
+            for day_offset in range(max((start - today).days, 0), min((end - today).days, days_range - 1) + 1):
+                period_start = today + timedelta(days=day_offset, hours=workday_start)
+                period_end = today + timedelta(days=day_offset, hours=workday_end)
+
+                busy_start = max(start, period_start)
+                busy_end = min(end, period_end)
+                if busy_start < busy_end:
+                    events.append((day_offset, busy_start, 1, user_id))
+                    events.append((day_offset, busy_end, -1, user_id))
+
+        events.sort(key=lambda event: (event[0], event[1]))
+
+        windows = []
+        position = 0
+        for day_offset in range(days_range):
+            period_start = today + timedelta(days=day_offset, hours=workday_start)
+            period_end = today + timedelta(days=day_offset, hours=workday_end)
+
+            busy_depth = {}
+            segments = []
+            cursor = period_start
+
+            while position < len(events) and events[position][0] == day_offset:
+                _, moment, delta, user_id = events[position]
+                if moment > cursor:
+                    segments.append((cursor, moment, total_users - len(busy_depth)))
+                    cursor = moment
+
+                depth = busy_depth.get(user_id, 0) + delta
+                if depth:
+                    busy_depth[user_id] = depth
+                else:
+                    busy_depth.pop(user_id, None)
+                position += 1
+
+            if cursor < period_end:
+                segments.append((cursor, period_end, total_users - len(busy_depth)))
+
+            windows.extend(self.extract_quorum_windows(segments, min_users, timedelta(minutes=min_duration)))
+
+        rank = lambda window: (-window[2], window[0] - window[1], window[0])
+        if top is None:
+            return sorted(windows, key=rank)
+
+        return heapq.nsmallest(top, windows, key=rank)
+
+    def extract_quorum_windows(self, segments, min_users, min_duration):
+        """
+        Для каждого отрезка с постоянным числом свободных пользователей находит
+        максимальное окно, в котором свободно не меньше людей (монотонный стек).
+        """
+        count = len(segments)
+        left = [0] * count
+        right = [count - 1] * count
+
+        stack = []
+        for i, (_, _, free) in enumerate(segments):
+            while stack and segments[stack[-1]][2] >= free:
+                stack.pop()
+            left[i] = stack[-1] + 1 if stack else 0
+            stack.append(i)
+
+        stack = []
+        for i in range(count - 1, -1, -1):
+            free = segments[i][2]
+            while stack and segments[stack[-1]][2] >= free:
+                stack.pop()
+            right[i] = stack[-1] - 1 if stack else count - 1
+            stack.append(i)
+
+        windows = {}
+        for i, (_, _, free) in enumerate(segments):
+            if free < min_users:
+                continue
+
+            start = segments[left[i]][0]
+            end = segments[right[i]][1]
+            if end - start >= min_duration:
+                windows[(start, end)] = free
+
+        return [(start, end, free) for (start, end), free in windows.items()]
+
     async def delete_activity(self, name_activity, user_id):
         async with aiosqlite.connect(self.path) as db:
             cursor = await db.execute('''
-            DELETE FROM schedules
+            SELECT ID, date FROM schedules
             WHERE user_id = ? AND activity_name = ?
             LIMIT 1''', (user_id, name_activity))
+            row = await cursor.fetchone()
+
+            if row:
+                cursor = await db.execute('''
+                DELETE FROM schedules
+                WHERE ID = ?''', (row[0],))
+                await self.rebuild_availability_day(db, user_id, row[1])
+
+                await db.commit()
+                return cursor.rowcount
+
+            await db.execute('''
+            DELETE FROM recurring_exceptions
+            WHERE rule_id IN (
+                SELECT ID FROM recurring_schedules
+                WHERE user_id = ? AND activity_name = ?)''', (user_id, name_activity))
+            cursor = await db.execute('''
+            DELETE FROM recurring_schedules
+            WHERE user_id = ? AND activity_name = ?''', (user_id, name_activity))
 
             await db.commit()
             return cursor.rowcount
@@ -221,4 +649,9 @@ class ScheduleUserDB:
             WHERE user_id = ? AND date = ?
             ORDER BY start_time DESC''', (user_id, date))
 
-            return await cursor.fetchall()
\ No newline at end of file
+            activities = await cursor.fetchall()
+
+        for _, _, start_time, end_time, name in await self.get_recurring_occurrences([user_id], date, date):
+            activities.append((start_time, end_time, name))
+
+        return sorted(activities, reverse=True)
@@ -1,9 +1,19 @@
 import asyncio
+from BOT.config import Config
 from BOT.core import TelegramBot
+from BOT.logging_config import setup_logging
+from BOT.workers import ShardedBotPool
 
 
 async def main():
-    bot  = TelegramBot(token)
+    setup_logging(Config.LOG_LEVEL, Config.LOG_FORMAT, Config.LOG_DEBUG_SAMPLE_RATE)
+
+    if Config.WORKERS > 0:
+        pool = ShardedBotPool(Config.BOT_TOKEN, Config.WORKERS, preload_models=Config.PRELOAD_MODELS)
+        await pool.run()
+        return
+
+    bot  = TelegramBot(Config.BOT_TOKEN)
     await bot.start()
 
 if __name__ == '__main__':
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import aiosqlite
+
+from DATABASE.availability import MINUTES_IN_DAY, free_runs, from_blob, mark_busy, to_blob
+from DATABASE.user_schedule import ScheduleUserDB
+
+TODAY = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+DAY = TODAY.strftime('%Y-%m-%d')
+NEXT_DAY = (TODAY + timedelta(days=1)).strftime('%Y-%m-%d')
+FULL_DAY = (1 << MINUTES_IN_DAY) - 1
+
+
+def test_mark_busy_edges():
+    assert mark_busy(0, '00:00', '00:01') == 1
+    assert mark_busy(0, '23:59', '24:00') == 1 << (MINUTES_IN_DAY - 1)
+    assert mark_busy(0, '00:00', '24:00') == FULL_DAY
+    assert mark_busy(0, '10:00', '10:00') == 0
+    assert mark_busy(0, '11:00', '10:00') == 0
+    assert from_blob(to_blob(FULL_DAY)) == FULL_DAY
+
+
+def test_free_runs_edges():
+    assert free_runs(0, 0, MINUTES_IN_DAY) == [(0, MINUTES_IN_DAY)]
+    assert free_runs(FULL_DAY, 0, MINUTES_IN_DAY) == []
+    # Соприкасающиеся занятия не оставляют между собой окна
+    busy = mark_busy(mark_busy(0, '09:00', '10:00'), '10:00', '11:00')
+    assert free_runs(busy, 0, MINUTES_IN_DAY) == [(0, 540), (660, MINUTES_IN_DAY)]
+    assert free_runs(busy, 540, 660) == []
+    assert free_runs(mark_busy(0, '00:00', '00:30'), 0, 60) == [(30, 60)]
+    assert free_runs(mark_busy(0, '23:30', '24:00'), 1380, MINUTES_IN_DAY) == [(1380, 1410)]
+
+
+def make_db(tmp_path):
+    db = ScheduleUserDB(str(tmp_path / 'schedule.db'))
+    asyncio.run(db.init_db())
+    return db
+
+
+def test_index_follows_add_and_delete(tmp_path):
+    db = make_db(tmp_path)
+
+    async def scenario():
+        await db.add_activity(1, DAY, '09:00', '10:00', 'пара')
+        await db.add_activity(2, DAY, '10:00', '12:00', 'работа')
+        added = (await db.get_availability_from_db([1, 2], 1))[DAY]
+        await db.delete_activity('пара', 1)
+        deleted = (await db.get_availability_from_db([1, 2], 1))[DAY]
+        await db.delete_activity('работа', 2)
+        empty = await db.get_availability_from_db([1, 2], 1)
+        return added, deleted, empty
+
+    added, deleted, empty = asyncio.run(scenario())
+    assert added == mark_busy(0, '09:00', '12:00')
+    assert deleted == mark_busy(0, '10:00', '12:00')
+    assert empty == {}
+
+
+def test_recurring_occurrences_and_exceptions_in_masks(tmp_path):
+    db = make_db(tmp_path)
+
+    async def scenario():
+        await db.add_activity(1, DAY, '09:00', '10:00', 'пара')
+        await db.add_recurring_activity(2, 'daily', DAY, NEXT_DAY, '13:00', '14:00', 'обед')
+        await db.add_recurring_exception(2, 'обед', NEXT_DAY)
+        return await db.get_availability_from_db([1, 2], 1)
+
+    masks = asyncio.run(scenario())
+    assert masks[DAY] == mark_busy(mark_busy(0, '09:00', '10:00'), '13:00', '14:00')
+    assert NEXT_DAY not in masks
+
+
+def test_bitset_engine_matches_dataframe(tmp_path):
+    db = make_db(tmp_path)
+
+    async def scenario():
+        await db.add_activity(1, DAY, '08:00', '09:30', 'пара')
+        await db.add_activity(2, DAY, '09:30', '11:00', 'работа')
+        await db.add_recurring_activity(3, 'daily', DAY, NEXT_DAY, '19:00', '21:00', 'спорт')
+        return (await db.find_common_free_time_bitset([1, 2, 3], 2),
+                await db.find_common_free_time_dataframe([1, 2, 3], 2))
+
+    bitset, dataframe = asyncio.run(scenario())
+    assert bitset == dataframe
+    assert bitset[0] == (TODAY + timedelta(hours=11), TODAY + timedelta(hours=19))
+
+
+def test_stale_index_is_repaired_on_startup(tmp_path):
+    db = make_db(tmp_path)
+
+    async def break_index():
+        await db.add_activity(1, DAY, '09:00', '10:00', 'пара')
+        await db.add_activity(1, NEXT_DAY, '09:00', '10:00', 'пара')
+        async with aiosqlite.connect(db.path) as connection:
+            # Как после сбоя: одна маска потеряна, другая не совпадает с занятиями
+            await connection.execute('DELETE FROM availability WHERE date = ?', (DAY,))
+            await connection.execute('UPDATE availability SET busy = ? WHERE date = ?', (to_blob(0), NEXT_DAY))
+            await connection.commit()
+
+    asyncio.run(break_index())
+    restarted = make_db(tmp_path)
+    masks = asyncio.run(restarted.get_availability_from_db([1], 2))
+    assert masks == {DAY: mark_busy(0, '09:00', '10:00'), NEXT_DAY: mark_busy(0, '09:00', '10:00')}
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from BOT.handlers.map_handlers.http_client import MapHttpClient
+
+
+class StubUpstream:
+    """Отвечает заданной последовательностью (статус, заголовки, задержка), затем 200"""
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.hits = 0
+        self.peers = []
+        self.app = web.Application()
+        self.app.router.add_route('*', '/api', self.handle)
+
+    async def handle(self, request):
+        self.hits += 1
+        self.peers.append(request.transport.get_extra_info('peername'))
+        status, headers, delay = self.responses.pop(0) if self.responses else (200, {}, 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if status != 200:
+            return web.Response(status=status, headers=headers)
+        return web.json_response({'ok': True, 'hit': self.hits})
+
+
+def run_with_server(upstream, scenario):
+    async def main():
+        async with TestServer(upstream.app) as server:
+            return await scenario(str(server.make_url('/api')))
+
+    return asyncio.run(main())
+
+
+def test_retries_429_and_5xx_then_succeeds():
+    upstream = StubUpstream([(429, {}, 0), (503, {}, 0), (502, {}, 0)])
+
+    async def scenario(url):
+        client = MapHttpClient(retries=3, backoff=0.05)
+        started = time.monotonic()
+        try:
+            result = await client.get_json(url)
+        finally:
+            await client.close()
+        return result, time.monotonic() - started
+
+    result, elapsed = run_with_server(upstream, scenario)
+    assert result == {'ok': True, 'hit': 4}
+    assert upstream.hits == 4
+    # Экспоненциальная задержка: 0.05 + 0.1 + 0.2 как минимум
+    assert elapsed >= 0.35
+
+
+def test_gives_up_after_retries():
+    upstream = StubUpstream([(500, {}, 0)] * 10)
+
+    async def scenario(url):
+        client = MapHttpClient(retries=2, backoff=0.01)
+        try:
+            with pytest.raises(aiohttp.ClientResponseError) as error:
+                await client.get_json(url)
+        finally:
+            await client.close()
+        return error.value.status
+
+    assert run_with_server(upstream, scenario) == 500
+    assert upstream.hits == 3
+
+
+def test_honours_retry_after():
+    upstream = StubUpstream([(429, {'Retry-After': '1'}, 0)])
+
+    async def scenario(url):
+        client = MapHttpClient(retries=1, backoff=0.01)
+        started = time.monotonic()
+        try:
+            await client.get_json(url)
+        finally:
+            await client.close()
+        return time.monotonic() - started
+
+    assert run_with_server(upstream, scenario) >= 1
+    assert upstream.hits == 2
+
+
+def test_retries_timeouts():
+    upstream = StubUpstream([(200, {}, 1)])
+
+    async def scenario(url):
+        client = MapHttpClient(timeout=0.2, retries=1, backoff=0.01)
+        try:
+            return await client.get_json(url)
+        finally:
+            await client.close()
+
+    assert run_with_server(upstream, scenario)['ok']
+    assert upstream.hits == 2
+
+    upstream = StubUpstream([(200, {}, 1)] * 3)
+
+    async def failing(url):
+        client = MapHttpClient(timeout=0.2, retries=1, backoff=0.01)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await client.get_json(url)
+        finally:
+            await client.close()
+
+    run_with_server(upstream, failing)
+    assert upstream.hits == 2
+
+
+def test_reuses_session_and_connection():
+    upstream = StubUpstream()
+
+    async def scenario(url):
+        client = MapHttpClient(max_concurrency=1)
+        try:
+            session = await client.get_session()
+            for page in range(5):
+                await client.get_json(url, params={'page': page})
+            assert await client.get_session() is session
+        finally:
+            await client.close()
+
+    run_with_server(upstream, scenario)
+    assert upstream.hits == 5
+    # Все запросы пришли по одному keep-alive соединению
+    assert len(set(upstream.peers)) == 1
+
+
+def test_coalesces_identical_requests():
+    upstream = StubUpstream([(200, {}, 0.2)])
+
+    async def scenario(url):
+        client = MapHttpClient()
+        try:
+            results = await asyncio.gather(*(client.get_json(url, params={'q': 'кафе'}) for _ in range(5)))
+        finally:
+            await client.close()
+        return results, client.metrics()['coalesced_requests']
+
+    results, coalesced = run_with_server(upstream, scenario)
+    assert upstream.hits == 1
+    assert coalesced == 4
+    assert all(result == results[0] for result in results)
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from BOT.handlers.map_handlers.geohash import encode, tiles_in_radius
+from BOT.handlers.map_handlers.http_client import MapHttpClient
+from BOT.handlers.map_handlers.map_handlers import MapHandlers
+from BOT.handlers.map_handlers.offline_index import build_index
+from BOT.handlers.map_handlers.places_cache import PlaceTileCache
+from BOT.handlers.map_handlers.utils_for_map_handlers import (PlacesUnavailableError, address_to_coordinates,
+                                                           get_tile_elements, get_top_5_places)
+
+
+def make_handlers(results):
+    """MapHandlers, у которого find_places по очереди отдаёт results (исключения пробрасываются)"""
+    handlers = MapHandlers(offline_index_path='/nonexistent', start_radius=250, max_radius=2000, radius_step=2)
+    radii = []
+
+    async def find_places(lat, lng, radius, k, amenities):
+        radii.append(radius)
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    handlers.find_places = find_places
+    return handlers, radii
+
+
+def test_widens_only_on_empty_results():
+    handlers, radii = make_handlers([[], [], [], [{'name': 'Кофейня'}] * 5])
+    places, radius = asyncio.run(handlers.search_places_adaptive(55.0, 82.9, 5))
+    assert radii == [250, 500, 1000, 2000]
+    assert radius == 2000 and len(places) == 5
+
+
+def test_failure_on_first_radius_propagates():
+    handlers, radii = make_handlers([PlacesUnavailableError('503'), []])
+    with pytest.raises(PlacesUnavailableError):
+        asyncio.run(handlers.search_places_adaptive(55.0, 82.9, 5))
+    assert radii == [250]
+
+
+def test_failure_stops_widening():
+    handlers, radii = make_handlers([[{'name': 'Кофейня'}], PlacesUnavailableError('timeout'), [], []])
+    places, radius = asyncio.run(handlers.search_places_adaptive(55.0, 82.9, 5))
+    assert radii == [250, 500]
+    assert (places, radius) == ([{'name': 'Кофейня'}], 250)
+
+
+def test_overpass_outage_is_not_an_empty_result():
+    hits = []
+
+    async def overpass(request):
+        hits.append(request)
+        return web.Response(status=504)
+
+    app = web.Application()
+    app.router.add_post('/api/interpreter', overpass)
+
+    async def scenario():
+        async with TestServer(app) as server:
+            client = MapHttpClient(retries=1, backoff=0.01)
+            try:
+                with pytest.raises(PlacesUnavailableError):
+                    await get_top_5_places(client, str(server.make_url('/api/interpreter')), 55.0, 82.9, 500)
+            finally:
+                await client.close()
+
+    asyncio.run(scenario())
+    assert len(hits) == 2
+
+
+class BrokenGeocodeCache:
+    """Кэш геокодирования, база которого заблокирована"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_coordinates(self, address):
+        self.calls.append('get')
+        raise sqlite3.OperationalError('database is locked')
+
+    async def save_coordinates(self, address, coords):
+        self.calls.append('save')
+        raise sqlite3.OperationalError('database is locked')
+
+
+def test_geocode_cache_errors_fall_through_to_nominatim():
+    async def nominatim(request):
+        return web.json_response([{'lat': '55.03', 'lon': '82.92'}])
+
+    app = web.Application()
+    app.router.add_get('/search', nominatim)
+    cache = BrokenGeocodeCache()
+
+    async def scenario():
+        async with TestServer(app) as server:
+            client = MapHttpClient(retries=0)
+            try:
+                return await address_to_coordinates(client, str(server.make_url('/search')), 'Красный проспект 1',
+                                                    'Новосибирск', cache=cache)
+            finally:
+                await client.close()
+
+    assert asyncio.run(scenario()) == (55.03, 82.92)
+    assert cache.calls == ['get', 'save']
+
+
+class ExpiringTileCache(PlaceTileCache):
+    """Каждый тайл живёт ровно до первого чтения"""
+
+    def get(self, tile):
+        elements = super().get(tile)
+        self.tiles.pop(tile, None)
+        return elements
+
+
+def test_tiles_expiring_during_fetch_are_kept():
+    cache = ExpiringTileCache()
+    latitude, longitude = 55.03, 82.92
+    home = encode(latitude, longitude, cache.precision)
+    cached_place = {'type': 'node', 'lat': latitude, 'lon': longitude, 'tags': {'amenity': 'cafe'}}
+    cache.put(home, [cached_place])
+
+    async def overpass(request):
+        return web.json_response({'elements': []})
+
+    app = web.Application()
+    app.router.add_post('/api/interpreter', overpass)
+
+    async def scenario():
+        async with TestServer(app) as server:
+            client = MapHttpClient(retries=0)
+            try:
+                return await get_tile_elements(client, str(server.make_url('/api/interpreter')),
+                                               latitude, longitude, 500, cache)
+            finally:
+                await client.close()
+
+    assert len(tiles_in_radius(latitude, longitude, 500, cache.precision)) > 1
+    assert asyncio.run(scenario()) == [cached_place]
+
+
+def test_offline_index_answers_during_overpass_outage(tmp_path):
+    # Единственное место в ~1.1 км: на 250, 500 и 1000 м индекс пуст и поиск идёт в Overpass
+    source = tmp_path / 'city.json'
+    source.write_text(json.dumps({'elements': [
+        {'type': 'node', 'id': 1, 'lat': 55.04, 'lon': 82.92, 'tags': {'amenity': 'cafe', 'name': 'Кофейня'}},
+    ]}), encoding='utf-8')
+    build_index(str(source), str(tmp_path / 'index'))
+
+    hits = []
+
+    async def overpass(request):
+        hits.append(request)
+        return web.Response(status=504)
+
+    app = web.Application()
+    app.router.add_post('/api/interpreter', overpass)
+
+    async def scenario():
+        async with TestServer(app) as server:
+            handlers = MapHandlers(offline_index_path=str(tmp_path / 'index'), start_radius=250, max_radius=2000)
+            handlers.http = MapHttpClient(retries=0)
+            handlers.overpass_url = str(server.make_url('/api/interpreter'))
+            try:
+                return await handlers.search_places_adaptive(55.03, 82.92, 1)
+            finally:
+                await handlers.close()
+
+    places, radius = asyncio.run(scenario())
+    assert radius == 2000
+    assert [place['name'] for place in places] == ['Кофейня']
+    assert len(hits) == 3
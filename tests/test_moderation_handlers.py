@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sentence_transformers')
+pytest.importorskip('transformers')
+
+from BOT.handlers.moderation_handlers import moderation_handlers  # noqa: E402
+from BOT.handlers.moderation_handlers.load_shedding import NO_TOPIC, NORMAL, PASS_THROUGH  # noqa: E402
+from BOT.handlers.moderation_handlers.moderation_handlers import ModerationHandlers  # noqa: E402
+from BOT.metrics import BotMetrics  # noqa: E402
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.saved = []
+
+    async def save_message(self, chat_id, text):
+        self.saved.append((chat_id, text))
+
+
+class FakeBot:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent.append(chat_id)
+
+
+def make_message(text):
+    async def delete():
+        message.deleted = True
+
+    message = SimpleNamespace(text=text, deleted=False, delete=delete, date=datetime.now(timezone.utc),
+                              chat=SimpleNamespace(id=-100, title='чат'), from_user=SimpleNamespace(id=7))
+    return message
+
+
+def make_handlers(monkeypatch, mode, toxicity=0.0, similar=True, bot=None):
+    calls = []
+
+    def fake_toxicity(text, model, tokenizer):
+        calls.append('toxicity')
+        time.sleep(0.05)
+        return np.array([toxicity])
+
+    async def fake_similarity(chat_id, text, database, model, threshold, run_model):
+        calls.append('topic')
+        return similar
+
+    monkeypatch.setattr(moderation_handlers, 'toxicity_testing', fake_toxicity)
+    monkeypatch.setattr(moderation_handlers, 'check_similarity_of_the_mes_and_top', fake_similarity)
+
+    handlers = ModerationHandlers(bot or FakeBot(), FakeDatabase(), models=(None, None, None))
+    handlers.load_shedder.observe = lambda depth, age: mode
+    handlers.load_shedder.sample_rate = 0
+    return handlers, calls
+
+
+@pytest.mark.parametrize('mode, expected_calls, saved', [
+    (NORMAL, ['toxicity', 'topic'], True),
+    # Непроверенные сообщения не попадают в контекст темы
+    (NO_TOPIC, ['toxicity'], False),
+    (PASS_THROUGH, [], False),
+])
+def test_only_fully_checked_messages_are_saved(monkeypatch, mode, expected_calls, saved):
+    handlers, calls = make_handlers(monkeypatch, mode)
+    message = make_message('встреча сегодня вечером в офисе')
+    asyncio.run(handlers.check_mes(message))
+    handlers.close()
+
+    assert calls == expected_calls
+    assert handlers.database.saved == ([(-100, message.text)] if saved else [])
+    assert not message.deleted
+
+
+def test_toxic_and_off_topic_messages_are_not_saved(monkeypatch):
+    handlers, _ = make_handlers(monkeypatch, NORMAL, toxicity=0.9)
+    toxic = make_message('очень грубое сообщение здесь')
+    asyncio.run(handlers.check_mes(toxic))
+    handlers.close()
+    assert toxic.deleted and handlers.database.saved == []
+
+    handlers, _ = make_handlers(monkeypatch, NORMAL, similar=False)
+    off_topic = make_message('совсем про другое сообщение')
+    asyncio.run(handlers.check_mes(off_topic))
+    handlers.close()
+    assert off_topic.deleted and handlers.database.saved == []
+
+
+def test_pending_counts_only_model_work(monkeypatch):
+    bot = FakeBot(latency=0.3)
+    handlers, _ = make_handlers(monkeypatch, NO_TOPIC, toxicity=0.9, bot=bot)
+    depths = []
+
+    async def scenario():
+        task = asyncio.create_task(handlers.check_mes(make_message('очень грубое сообщение здесь')))
+        await asyncio.sleep(0.02)
+        depths.append(handlers.pending)
+        # Модель отработала, предупреждение ещё отправляется
+        await asyncio.sleep(0.15)
+        depths.append(handlers.pending)
+        await task
+
+    asyncio.run(scenario())
+    handlers.close()
+    assert depths == [1, 0]
+    assert bot.sent == [7]
+
+
+def test_inference_is_recorded_on_the_loop_thread(monkeypatch):
+    metrics = BotMetrics()
+    handlers, _ = make_handlers(monkeypatch, NO_TOPIC)
+    handlers.metrics = metrics
+    threads = []
+    observe = metrics.inference_latency.observe
+
+    def recording_observe(value, **labels):
+        threads.append(threading.current_thread())
+        observe(value, **labels)
+
+    metrics.inference_latency.observe = recording_observe
+    asyncio.run(handlers.check_mes(make_message('встреча сегодня вечером в офисе')))
+    handlers.close()
+
+    assert threads == [threading.main_thread()]
+    (labels, (counts, total)), = metrics.inference_latency.series.items()
+    assert labels == (('model', 'toxicity'),)
+    assert sum(counts) == 1 and total >= 0.05
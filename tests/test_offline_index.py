@@ -0,0 +1,160 @@
+import json
+import random
+import xml.etree.ElementTree as ET
+from math import asin, cos, radians, sin, sqrt
+
+import pytest
+
+from BOT.handlers.map_handlers import offline_index
+from BOT.handlers.map_handlers.offline_index import OfflinePlacesIndex, build_index, read_osm_xml
+
+OSM = '''<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <bounds minlat="55.0" minlon="82.9" maxlat="55.1" maxlon="83.0"/>
+  <node id="1" lat="55.00" lon="82.90"><tag k="amenity" v="cafe"/><tag k="name" v="Кофейня"/></node>
+  <node id="2" lat="55.02" lon="82.92"/>
+  <node id="3" lat="55.04" lon="82.94"/>
+  <node id="4" lat="55.05" lon="82.95"><tag k="amenity" v="bench"/><tag k="name" v="Скамейка"/></node>
+  <way id="10"><nd ref="2"/><nd ref="3"/><tag k="amenity" v="restaurant"/><tag k="name" v="Столовая"/></way>
+  <way id="11"><nd ref="3"/><nd ref="4"/><tag k="highway" v="footway"/></way>
+  <relation id="20"><member type="way" ref="11" role=""/><tag k="type" v="route"/></relation>
+</osm>
+'''
+
+
+def test_read_osm_xml_nodes_and_ways(tmp_path):
+    path = tmp_path / 'city.osm'
+    path.write_text(OSM, encoding='utf-8')
+
+    places = sorted(read_osm_xml(str(path), ['cafe', 'restaurant']))
+    assert [(round(lat, 3), round(lon, 3), tags['name']) for lat, lon, tags in places] == \
+        [(55.0, 82.9, 'Кофейня'), (55.03, 82.93, 'Столовая')]
+
+
+def test_processed_elements_are_dropped(tmp_path, monkeypatch):
+    path = tmp_path / 'city.osm'
+    path.write_text(OSM, encoding='utf-8')
+
+    roots = []
+    iterparse = ET.iterparse
+
+    def tracking_iterparse(source, events=None):
+        for event, element in iterparse(source, events):
+            if not roots:
+                roots.append(element)
+            yield event, element
+
+    monkeypatch.setattr(offline_index.ET, 'iterparse', tracking_iterparse)
+    elements = [element.tag for element in offline_index.iter_osm_elements(str(path))]
+
+    assert elements == ['bounds'] + ['node'] * 4 + ['way'] * 2 + ['relation']
+    # Обработанные элементы не остаются в дереве
+    assert len(roots[0]) == 0
+
+
+CENTER = (55.03, 82.92)
+AMENITY_TYPES = ['cafe', 'restaurant', 'bar']
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    dlat, dlon = radians(lat2 - lat1), radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * 6371000 * asin(sqrt(a))
+
+
+def make_places(count=400, seed=7):
+    """Случайные места в квадрате ~6x6 км вокруг CENTER, с уникальными именами"""
+    rng = random.Random(seed)
+    return [(CENTER[0] + rng.uniform(-0.03, 0.03), CENTER[1] + rng.uniform(-0.05, 0.05),
+             {'name': f'Место {i}', 'amenity': rng.choice(AMENITY_TYPES)})
+            for i in range(count)]
+
+
+def write_overpass_json(path, places):
+    elements = []
+    for i, (lat, lon, tags) in enumerate(places):
+        if i % 3:
+            elements.append({'type': 'node', 'id': i, 'lat': lat, 'lon': lon, 'tags': tags})
+        else:
+            elements.append({'type': 'way', 'id': i, 'center': {'lat': lat, 'lon': lon}, 'tags': tags})
+    # Не попадают в индекс: без имени, чужой тип, линия без центра
+    elements.append({'type': 'node', 'id': -1, 'lat': CENTER[0], 'lon': CENTER[1], 'tags': {'amenity': 'cafe'}})
+    elements.append({'type': 'node', 'id': -2, 'lat': CENTER[0], 'lon': CENTER[1],
+                     'tags': {'amenity': 'bench', 'name': 'Скамейка'}})
+    elements.append({'type': 'way', 'id': -3, 'tags': {'amenity': 'cafe', 'name': 'Без центра'}})
+    path.write_text(json.dumps({'elements': elements}), encoding='utf-8')
+
+
+@pytest.fixture
+def places_index(tmp_path):
+    places = make_places()
+    source = tmp_path / 'city.json'
+    write_overpass_json(source, places)
+    count = build_index(str(source), str(tmp_path / 'index'), amenities=AMENITY_TYPES, cell_size=0.01)
+    assert count == len(places)
+
+    index = OfflinePlacesIndex(str(tmp_path / 'index'))
+    yield index, places
+    index.close()
+
+
+def brute_force(places, latitude, longitude, k, radius, amenities=None):
+    found = [(haversine(latitude, longitude, lat, lon), tags['name']) for lat, lon, tags in places
+             if amenities is None or tags['amenity'] in amenities]
+    return [name for distance, name in sorted(found) if distance <= radius][:k]
+
+
+@pytest.mark.parametrize('latitude, longitude', [
+    CENTER,
+    (55.0, 82.9),        # углы ячеек 0.01
+    (55.0049, 82.9351),  # рядом с краем строки ячеек
+    (55.059, 82.969),    # у края выгрузки
+])
+@pytest.mark.parametrize('radius', [150, 700, 2500])
+def test_nearest_matches_brute_force(places_index, latitude, longitude, radius):
+    index, places = places_index
+    for k in (1, 5, 50):
+        found = index.nearest(latitude, longitude, k=k, radius=radius)
+        assert [tags['name'] for tags, _, _, _ in found] == brute_force(places, latitude, longitude, k, radius)
+
+        distances = [distance for _, _, _, distance in found]
+        assert distances == sorted(distances)
+        assert all(distance <= radius for distance in distances)
+
+
+def test_nearest_filters_amenities(places_index):
+    index, places = places_index
+    found = index.nearest(*CENTER, k=20, radius=2000, amenities=['bar', 'pub'])
+
+    assert found and all(tags['amenity'] == 'bar' for tags, _, _, _ in found)
+    assert [tags['name'] for tags, _, _, _ in found] == brute_force(places, *CENTER, 20, 2000, ['bar'])
+    assert index.nearest(*CENTER, k=20, radius=2000, amenities=['biergarten']) == []
+
+
+def test_candidates_cover_the_search_square(places_index):
+    index, places = places_index
+    # Квадрат пересекает границы и строк, и столбцов сетки
+    latitude, longitude, radius = 55.0, 82.9, 1200
+    lat_delta = radius / offline_index.METERS_PER_DEGREE
+    lon_delta = radius / (offline_index.METERS_PER_DEGREE * cos(radians(latitude)))
+
+    candidates = index.candidates(latitude, longitude, radius)
+    coords = index.coords[candidates]
+    in_square = [(lat, lon) for lat, lon, _ in places
+                 if abs(lat - latitude) <= lat_delta and abs(lon - longitude) <= lon_delta]
+    assert set(in_square) <= {tuple(point) for point in coords.tolist()}
+    assert len(set(candidates.tolist())) == len(candidates)
+
+    # Лишними бывают только точки из крайних ячеек, пересекающих квадрат
+    cell = index.cell_size
+    assert (coords[:, 0] >= latitude - lat_delta - cell).all() and (coords[:, 0] <= latitude + lat_delta + cell).all()
+    assert (coords[:, 1] >= longitude - lon_delta - cell).all() and (coords[:, 1] <= longitude + lon_delta + cell).all()
+    # Ячейки из нескольких строк сетки
+    rows = {int((lat + 90) // cell) for lat in coords[:, 0]}
+    assert len(rows) > 1
+
+
+def test_candidates_outside_the_extract(places_index):
+    index, _ = places_index
+    assert len(index.candidates(60.0, 30.0, 1000)) == 0
+    assert index.nearest(60.0, 30.0) == []
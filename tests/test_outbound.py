@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+import json
+import time
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+
+from BOT.outbound import PRIORITY_WARNING, OutboundQueue, outbound
+
+
+class FakeSession(BaseSession):
+    """Сессия без сети: записывает исходящие запросы; retry_after[chat_id] - сколько раз ответить 429 этому чату"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+        self.retry_after = {}
+        self.message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        chat_id = getattr(method, 'chat_id', None)
+        if self.retry_after.get(chat_id):
+            self.retry_after[chat_id] -= 1
+            self.sent.append((method.__api_method__, chat_id, 'retry_after'))
+            content = json.dumps({'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                                  'parameters': {'retry_after': 1}})
+            return self.check_response(bot=bot, method=method, status_code=429, content=content).result
+
+        self.sent.append((method.__api_method__, chat_id, getattr(method, 'text', None)))
+        result = True
+        if method.__api_method__ == 'sendMessage':
+            result = {'message_id': next(self.message_ids), 'date': int(time.time()), 'text': method.text,
+                      'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'}}
+        content = json.dumps({'ok': True, 'result': result})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def run_bot(scenario, **options):
+    async def main():
+        session = FakeSession()
+        bot = Bot('123456:outbound-test', session=session)
+        queue = OutboundQueue(**options)
+        bot.session.middleware(queue)
+        try:
+            result = await scenario(bot, queue)
+        finally:
+            await queue.close()
+            await bot.session.close()
+        return session.sent, queue, result
+
+    return asyncio.run(main())
+
+
+def test_priority_order():
+    async def scenario(bot, queue):
+        async def warning(chat_id):
+            with outbound(priority=PRIORITY_WARNING):
+                await bot.send_message(chat_id, 'предупреждение')
+
+        await asyncio.gather(
+            bot.send_message(1, 'ответ 1'),
+            bot.send_message(2, 'ответ 2'),
+            warning(3),
+            bot.delete_message(4, 10),
+            bot.send_message(5, 'ответ 3'),
+        )
+
+    sent, queue, _ = run_bot(scenario, global_rate=100, global_burst=1)
+    assert [(name, chat_id) for name, chat_id, _ in sent] == [
+        ('deleteMessage', 4), ('sendMessage', 3), ('sendMessage', 1), ('sendMessage', 2), ('sendMessage', 5)]
+    assert queue.metrics()['sent'] == 5
+
+
+def test_retry_after_requeues_and_blocks_only_that_chat():
+    async def scenario(bot, queue):
+        bot.session.retry_after[1] = 1
+        started = time.monotonic()
+        done = {}
+
+        async def send(chat_id, text):
+            await bot.send_message(chat_id, text)
+            done[text] = time.monotonic() - started
+
+        await asyncio.gather(send(1, 'первое'), send(1, 'второе'), send(2, 'другой чат'))
+        return done
+
+    sent, queue, done = run_bot(scenario, global_rate=100, global_burst=100, chat_rate=100, chat_burst=1)
+    assert sent == [
+        ('sendMessage', 1, 'retry_after'),
+        ('sendMessage', 2, 'другой чат'),
+        # Повтор сохраняет место перед следующим сообщением того же чата
+        ('sendMessage', 1, 'первое'),
+        ('sendMessage', 1, 'второе'),
+    ]
+    assert done['другой чат'] < 0.5
+    assert done['первое'] >= 1
+    assert queue.metrics()['retry_after'] == 1
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def scenario(bot, queue):
+        bot.session.retry_after[1] = 10
+        with pytest.raises(TelegramRetryAfter):
+            await bot.send_message(1, 'не уйдёт')
+
+    sent, queue, _ = run_bot(scenario, max_retries=1, chat_rate=100)
+    assert len(sent) == 2
+    assert queue.metrics()['failed'] == 1
+
+
+def test_coalescing_by_key():
+    async def scenario(bot, queue):
+        async def warn(kind, user_id):
+            with outbound(priority=PRIORITY_WARNING, coalesce_key=('warning', kind, user_id)):
+                return await bot.send_message(user_id, kind)
+
+        first = await asyncio.gather(warn('toxic', 7), warn('toxic', 7), warn('off_topic', 7), warn('toxic', 8))
+        # Пока не истекло coalesce_window, повтор не отправляется вовсе
+        repeated = await warn('toxic', 7)
+        return first, repeated
+
+    sent, queue, (first, repeated) = run_bot(scenario, chat_rate=100, chat_burst=10)
+    assert sorted((chat_id, text) for _, chat_id, text in sent) == [(7, 'off_topic'), (7, 'toxic'), (8, 'toxic')]
+    assert first[0].message_id == first[1].message_id
+    assert repeated is None
+    assert queue.metrics()['coalesced'] == 2
+
+
+def test_blocked_chats_are_not_rescanned():
+    async def scenario(bot, queue):
+        now = time.monotonic()
+        for chat_id in range(1000):
+            queue.blocked_until[chat_id] = now + 60
+        tasks = [asyncio.create_task(bot.send_message(chat_id, 'ждёт')) for chat_id in range(1000)]
+        await asyncio.sleep(0.1)
+        assert len(queue.sleeping) == 1000
+
+        checks = 0
+        job_delay = queue.job_delay
+
+        def counting_job_delay(job, now):
+            nonlocal checks
+            checks += 1
+            return job_delay(job, now)
+
+        queue.job_delay = counting_job_delay
+        for i in range(20):
+            await bot.send_message(5000 + i, 'свободный чат')
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Заблокированные чаты проснутся только через минуту, ждать их незачем
+        await queue.close(timeout=0.01)
+        return checks
+
+    sent, queue, checks = run_bot(scenario, global_rate=1000, global_burst=1000, chat_rate=100)
+    assert len(sent) == 20
+    # Каждый запрос к свободному чату проверяется один раз, заблокированные не перебираются
+    assert checks == 20
+
+
+def test_moderation_skips_the_chat_limit():
+    async def scenario(bot, queue):
+        started = time.monotonic()
+        # Волна спама в одном чате: удаления не ждут лимита 1 сообщение в секунду
+        await asyncio.gather(*(bot.delete_message(-100, message_id) for message_id in range(10)))
+        deleted = time.monotonic() - started
+        # И не расходуют его: ответы в тот же чат уходят сразу в пределах всплеска
+        await asyncio.gather(bot.send_message(-100, 'первый'), bot.send_message(-100, 'второй'))
+        return deleted, time.monotonic() - started
+
+    sent, queue, (deleted, answered) = run_bot(scenario, global_rate=100, global_burst=100, chat_rate=1, chat_burst=2)
+    assert [name for name, _, _ in sent] == ['deleteMessage'] * 10 + ['sendMessage'] * 2
+    assert deleted < 0.5
+    assert answered < 0.5
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from DATABASE.user_schedule import ScheduleUserDB
+
+TODAY = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+DAY = TODAY.strftime('%Y-%m-%d')
+
+
+def at(hours, minutes=0):
+    return TODAY + timedelta(hours=hours, minutes=minutes)
+
+
+def find(tmp_path, **options):
+    """Три пользователя: 1 занят 9-12, 2 занят 11-14, 3 занят 16-20"""
+    db = ScheduleUserDB(str(tmp_path / 'schedule.db'))
+
+    async def scenario():
+        await db.init_db()
+        await db.add_activity(1, DAY, '09:00', '12:00', 'пара')
+        await db.add_activity(2, DAY, '11:00', '14:00', 'работа')
+        await db.add_activity(3, DAY, '16:00', '20:00', 'спорт')
+        return await db.find_quorum_free_time([1, 2, 3], 1, **options)
+
+    return asyncio.run(scenario())
+
+
+def test_all_users_free(tmp_path):
+    assert find(tmp_path) == [(at(14), at(16), 3)]
+
+
+def test_quorum_less_than_all(tmp_path):
+    assert find(tmp_path, min_users=2, top=None) == [
+        (at(14), at(16), 3),
+        (at(12), at(20), 2),
+        (at(9), at(11), 2),
+    ]
+
+
+def test_min_duration_filters_short_windows(tmp_path):
+    assert find(tmp_path, min_users=2, min_duration=150, top=None) == [(at(12), at(20), 2)]
+    assert find(tmp_path, min_users=3, min_duration=121) == []
+
+
+def test_top_keeps_best_ranked(tmp_path):
+    assert find(tmp_path, min_users=1, top=2) == [(at(14), at(16), 3), (at(12), at(20), 2)]
+    assert find(tmp_path, min_users=1, top=None)[-1] == (at(9), at(20), 1)
+
+
+def test_extract_quorum_windows_is_maximal():
+    db = ScheduleUserDB(':memory:')
+    segments = [(at(9), at(10), 2), (at(10), at(11), 3), (at(11), at(12), 1), (at(12), at(13), 3)]
+    windows = sorted(db.extract_quorum_windows(segments, 2, timedelta(0)))
+    assert windows == [(at(9), at(11), 2), (at(10), at(11), 3), (at(12), at(13), 3)]
@@ -0,0 +1,53 @@
+import asyncio
+
+from DATABASE.user_schedule import ScheduleUserDB, occurrence_dates
+
+
+def make_db(tmp_path):
+    db = ScheduleUserDB(str(tmp_path / 'schedule.db'))
+    asyncio.run(db.init_db())
+    return db
+
+
+def test_occurrence_dates_weekly_window():
+    assert occurrence_dates('weekly', '2025-09-01', '2025-09-30', '2025-09-03', '2025-09-20') == \
+        ['2025-09-08', '2025-09-15']
+    assert occurrence_dates('daily', '2025-09-01', '2025-09-03', '2025-08-01', '2025-12-01') == \
+        ['2025-09-01', '2025-09-02', '2025-09-03']
+
+
+def test_exception_only_for_real_occurrence(tmp_path):
+    db = make_db(tmp_path)
+
+    async def scenario():
+        await db.add_recurring_activity(1, 'weekly', '2025-09-01', '2025-09-29', '10:00', '11:30', 'матанализ')
+        # 2025-09-02 - вторник, а занятие по понедельникам
+        assert await db.add_recurring_exception(1, 'матанализ', '2025-09-02') == 0
+        assert await db.add_recurring_exception(1, 'матанализ', '2025-09-08') == 1
+        return await db.get_recurring_occurrences([1], '2025-09-01', '2025-09-30')
+
+    dates = [occurrence[1] for occurrence in asyncio.run(scenario())]
+    assert dates == ['2025-09-01', '2025-09-15', '2025-09-22', '2025-09-29']
+
+
+def test_recurring_activity_checks_overlaps(tmp_path):
+    db = make_db(tmp_path)
+
+    async def scenario():
+        assert (await db.add_activity(1, '2025-09-15', '10:30', '11:00', 'консультация'))[0]
+        # Разовое занятие во вторник не мешает занятиям по понедельникам
+        assert (await db.add_activity(1, '2025-09-16', '10:00', '11:00', 'семинар'))[0]
+
+        success, text = await db.add_recurring_activity(1, 'weekly', '2025-09-01', '2025-09-29', '10:00', '11:30',
+                                                        'матанализ')
+        assert not success
+        assert 'консультация - 2025-09-15' in text and 'семинар' not in text
+
+        assert (await db.add_recurring_activity(1, 'weekly', '2025-09-01', '2025-09-29', '12:00', '13:00',
+                                                'матанализ'))[0]
+        success, text = await db.add_recurring_activity(1, 'daily', '2025-09-20', '2025-09-25', '12:30', '12:45',
+                                                        'обед')
+        assert not success
+        assert 'матанализ - 2025-09-22' in text
+
+    asyncio.run(scenario())
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiohttp.test_utils import TestClient, TestServer
+
+from BOT.webhook import WebhookServer
+
+SECRET = 'test_Secret-123'
+HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+UPDATE = {
+    'update_id': 1,
+    'message': {
+        'message_id': 1,
+        'date': 1700000000,
+        'chat': {'id': -100, 'type': 'supergroup', 'title': 'chat'},
+        'from': {'id': 7, 'is_bot': False, 'first_name': 'user'},
+        'text': 'привет',
+    },
+}
+
+
+def run_webhook(scenario):
+    """Запускает WebhookServer в TestClient и возвращает полученные обновления и результат scenario"""
+    received = []
+
+    async def feed_update(update):
+        received.append(update)
+
+    async def main():
+        bot = Bot('123456:webhook-test')
+        server = WebhookServer(bot, feed_update, secret_token=SECRET)
+        async with TestClient(TestServer(server.create_app())) as client:
+            result = await scenario(client)
+            await server.drain()
+        await bot.session.close()
+        return result
+
+    return received, asyncio.run(main())
+
+
+def test_good_secret_is_accepted():
+    async def scenario(client):
+        response = await client.post('/webhook', json=UPDATE, headers={HEADER: SECRET})
+        return response.status
+
+    received, status = run_webhook(scenario)
+    assert status == 200
+    assert [update.update_id for update in received] == [1]
+    assert received[0].message.text == 'привет'
+
+
+@pytest.mark.parametrize('headers', [
+    {},
+    {HEADER: ''},
+    {HEADER: 'wrong'},
+    {HEADER: SECRET + 'x'},
+    {HEADER: 'секрет'},
+])
+def test_bad_or_missing_secret_is_rejected(headers):
+    async def scenario(client):
+        response = await client.post('/webhook', json=UPDATE, headers=headers)
+        return response.status
+
+    received, status = run_webhook(scenario)
+    assert status == 403
+    assert received == []
+
+
+def test_non_utf8_secret_is_rejected():
+    async def scenario(client):
+        reader, writer = await asyncio.open_connection(client.host, client.port)
+        writer.write(b'POST /webhook HTTP/1.1\r\nHost: localhost\r\n' + HEADER.encode() +
+                     b': \xff\xfe\xd0\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}')
+        await writer.drain()
+        status_line = await reader.readline()
+        writer.close()
+        return status_line
+
+    received, status_line = run_webhook(scenario)
+    assert status_line.startswith(b'HTTP/1.1 403')
+    assert received == []
+
+
+@pytest.mark.parametrize('body', [b'{"update_id": ', b'[]', b'1', b'"update"', b'null'])
+def test_malformed_json_is_rejected(body):
+    async def scenario(client):
+        response = await client.post('/webhook', data=body, headers={HEADER: SECRET})
+        return response.status
+
+    received, status = run_webhook(scenario)
+    assert status == 400
+    assert received == []
+
+
+@pytest.mark.parametrize('secret', [None, '', 'пароль', 'with space', 'x' * 257])
+def test_server_requires_valid_secret(secret):
+    async def main():
+        bot = Bot('123456:webhook-test')
+        try:
+            with pytest.raises(ValueError):
+                WebhookServer(bot, None, secret_token=secret)
+        finally:
+            await bot.session.close()
+
+    asyncio.run(main())
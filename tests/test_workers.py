@@ -0,0 +1,166 @@
+import asyncio
+import os
+import socket
+import time
+
+import pytest
+from aiogram.types import Update
+from aiohttp import ClientSession
+
+from BOT.config import Config
+from BOT.workers import ShardedBotPool
+
+RECEIVED_ENV = 'TEST_WORKERS_RECEIVED'
+
+
+def echo_worker(index, token, queue, heartbeat, heartbeat_interval, workers=1, preload_models=False):
+    """Воркер без бота: записывает pid и chat_id каждого обновления в файл"""
+    heartbeat.value = time.time()
+    while True:
+        try:
+            item = queue.get(timeout=heartbeat_interval)
+        except Exception:
+            heartbeat.value = time.time()
+            continue
+        if item is None:
+            return
+        with open(os.environ[RECEIVED_ENV], 'a') as file:
+            file.write(f'{os.getpid()} {item[0]}\n')
+        heartbeat.value = time.time()
+
+
+class EchoPool(ShardedBotPool):
+    worker_target = staticmethod(echo_worker)
+
+
+def make_update(update_id, chat_id):
+    return Update.model_validate({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': 'chat'},
+            'from': {'id': 7, 'is_bot': False, 'first_name': 'user'},
+            'text': 'привет',
+        },
+    })
+
+
+def read_received(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [tuple(map(int, line.split())) for line in file]
+
+
+async def wait_for(condition, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'не дождались'
+        await asyncio.sleep(0.05)
+
+
+# preload_models=True - воркеры запускаются через forkserver
+@pytest.mark.parametrize('preload_models', [False, True])
+def test_restarted_worker_receives_updates(tmp_path, monkeypatch, preload_models):
+    path = str(tmp_path / 'received.txt')
+    monkeypatch.setenv(RECEIVED_ENV, path)
+
+    async def scenario():
+        pool = EchoPool('123456:workers-test', workers=1, heartbeat_interval=0.1, heartbeat_timeout=5,
+                        preload_models=preload_models)
+        supervisor = None
+        try:
+            pool.start_worker(0)
+            first = pool.processes[0]
+            await pool.dispatch(make_update(1, -100))
+            await wait_for(lambda: len(read_received(path)) == 1)
+
+            # Воркер убит, пока ждёт в queue.get: замок чтения очереди остаётся захваченным
+            await asyncio.sleep(0.2)
+            first.kill()
+            first.join(5)
+
+            supervisor = asyncio.create_task(pool.supervise())
+            await wait_for(lambda: pool.restarts[0] == 1 and pool.is_healthy(0))
+
+            await pool.dispatch(make_update(2, -100))
+            await pool.dispatch(make_update(3, -200))
+            await wait_for(lambda: len(read_received(path)) == 3, timeout=10)
+
+            second = pool.processes[0]
+            assert second.pid != first.pid
+            return read_received(path), first.pid, second.pid
+        finally:
+            if supervisor is not None:
+                supervisor.cancel()
+            pool.stop_workers(timeout=5)
+            await pool.bot.session.close()
+
+    received, first_pid, second_pid = asyncio.run(scenario())
+    assert received == [(first_pid, -100), (second_pid, -100), (second_pid, -200)]
+
+
+def test_queued_updates_survive_restart(tmp_path, monkeypatch):
+    path = str(tmp_path / 'received.txt')
+    monkeypatch.setenv(RECEIVED_ENV, path)
+
+    async def scenario():
+        pool = EchoPool('123456:workers-test', workers=1, heartbeat_interval=0.1)
+        try:
+            # Воркер ещё не запущен: обновления ждут в очереди и переносятся в новую
+            await pool.dispatch(make_update(1, -100))
+            await pool.dispatch(make_update(2, -100))
+            await asyncio.sleep(0.2)
+            pool.replace_queue(0)
+            pool.start_worker(0)
+            await wait_for(lambda: len(read_received(path)) == 2)
+            return [chat_id for _, chat_id in read_received(path)]
+        finally:
+            pool.stop_workers(timeout=5)
+            await pool.bot.session.close()
+
+    assert asyncio.run(scenario()) == [-100, -100]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_health_is_served_in_polling_mode():
+    class PollingConfig(Config):
+        DELIVERY_MODE = 'polling'
+        METRICS_HOST = '127.0.0.1'
+        METRICS_PORT = free_port()
+
+    async def scenario():
+        pool = EchoPool('123456:workers-test', workers=2, config=PollingConfig, heartbeat_interval=0.1)
+        runner = None
+        try:
+            for index in range(pool.workers):
+                pool.start_worker(index)
+            await wait_for(lambda: all(heartbeat.value for heartbeat in pool.heartbeats))
+            runner = await pool.serve_health()
+
+            url = f'http://127.0.0.1:{PollingConfig.METRICS_PORT}/health'
+            async with ClientSession() as session:
+                async with session.get(url) as response:
+                    healthy = response.status, await response.json()
+                pool.processes[1].kill()
+                pool.processes[1].join(5)
+                async with session.get(url) as response:
+                    broken = response.status, await response.json()
+            return healthy, broken
+        finally:
+            if runner is not None:
+                await runner.cleanup()
+            pool.stop_workers(timeout=5)
+            await pool.bot.session.close()
+
+    (status, workers), (broken_status, broken_workers) = asyncio.run(scenario())
+    assert status == 200
+    assert [(worker['worker'], worker['alive']) for worker in workers] == [(0, True), (1, True)]
+    assert broken_status == 503
+    assert [worker['alive'] for worker in broken_workers] == [True, False]